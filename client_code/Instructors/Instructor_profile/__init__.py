@@ -7,6 +7,7 @@ import anvil.tables as tables
 import anvil.tables.query as q
 from anvil.tables import app_tables
 import anvil.users
+from ...config_cache import get_config
 
 
 class Instructor_profile(Instructor_profileTemplate):
@@ -19,16 +20,11 @@ class Instructor_profile(Instructor_profileTemplate):
             instructor=self.instructor
         )
 
-        # Get lesson slots from globals
-        self.lesson_slots = app_tables.global_variables_edit_with_care.get(
-            version="latest"
-        )["current_teen_driving_schedule"]
-        self.availability_codes = app_tables.global_variables_edit_with_care.get(
-            version="latest"
-        )["instructor_availability_codes"]
-        self.days_formatted = app_tables.global_variables_edit_with_care.get(
-            version="latest"
-        )["days_full"]
+        # Get lesson slots from the cached app config
+        config = get_config()
+        self.lesson_slots = config["current_teen_driving_schedule"]
+        self.availability_codes = config["instructor_availability_codes"]
+        self.days_formatted = config["days_full"]
 
         # Check instructor profile
         print(self.instructor["firstName"])
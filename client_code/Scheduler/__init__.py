@@ -11,7 +11,22 @@ import json
 from datetime import date, time, datetime, timedelta
 from time import sleep
 import plotly.graph_objects as go
-import uuid
+from ..config_cache import check_version
+from ..globals import HEATMAP_CODE_LABELS, HEATMAP_CODE_COLOURS
+
+# Last get_scheduler_bootstrap result, kept for the session so reopening the
+# form only refetches the lists when their version has changed
+_bootstrap = None
+
+
+def load_bootstrap():
+    global _bootstrap
+    known_version = _bootstrap["version"] if _bootstrap else None
+    result = anvil.server.call("get_scheduler_bootstrap", known_version)
+    check_version(result["config_version"])
+    if not result["unchanged"]:
+        _bootstrap = result
+    return _bootstrap, result["heatmap"]
 
 
 class Scheduler(SchedulerTemplate):
@@ -23,27 +38,29 @@ class Scheduler(SchedulerTemplate):
         self.classroom_name = ""
         self.start_date = None
 
-        school_list = app_tables.schools.search()
+        # Schools, classrooms, instructors and today's heatmap in one call
+        bootstrap, heatmap = load_bootstrap()
+
         self.school_selector.items = [
-            (s['abbreviation'], s["abbreviation"]) for s in school_list
+            (abbreviation, abbreviation) for abbreviation in bootstrap["schools"]
         ] # f"{s['abbreviation']} - {s['school_name']}"
         self.filter_instructors = False
 
         self.COURSE_STRUCTURE = "None"
 
         classroom_placeholder = [("Select a classroom", None)]
-        current_classrooms = app_tables.classrooms.search()
-        classroom_items = [
-            (c["classroom_name"], c["classroom_name"]) for c in current_classrooms
-        ]
+        classroom_items = [(name, name) for name in bootstrap["classrooms"]]
         self.classroom_selector.items = classroom_placeholder + classroom_items
         self.classroom_selector.selected_value = None
 
-        instructor_placeholder = [("Select an instructor", None)]
-        self.instructors = app_tables.users.search(is_instructor=True)
+        # Instructor rows in display order
+        self.instructors = [i["row"] for i in bootstrap["instructors"]]
+
+        # Position of the first instructor shown when all instructors are displayed
+        self.heatmap_offset = 0
 
         self.populate_instructor_filter_drop_down()
-        self.refresh_schedule_display()
+        self.refresh_schedule_display(page=heatmap)
 
 
 # ##############################################
@@ -51,8 +68,7 @@ class Scheduler(SchedulerTemplate):
 
     def populate_instructor_filter_drop_down(self):
         """Populate the dropdown with available instructors"""
-        # Get all instructors from the database
-        instructors = app_tables.users.search(tables.order_by("display_order", ascending=True), is_instructor=True)
+        instructors = self.instructors
         instructor_names = [
             f"{instructor['firstName']} {instructor['surname']}"
             for instructor in instructors
@@ -73,7 +89,7 @@ class Scheduler(SchedulerTemplate):
 # Gets all current parameters and rebuilds the display including the availability heatmap
 # This is triggered after every function call so availability remains up to date
   
-    def refresh_schedule_display(self, start_date=None):
+    def refresh_schedule_display(self, start_date=None, page=None):
         if start_date is None:
             self.start_date = datetime.now().date()
         formatted_date = self.start_date.strftime("%A, %B %d")
@@ -85,44 +101,33 @@ class Scheduler(SchedulerTemplate):
             if self.instructor_filter_drop_down.selected_value:
                 selected_instructors = [self.instructor_filter_drop_down.selected_value]
                 self.instructor_list.visible = False
+            data = anvil.server.call(
+                "process_instructor_availability", selected_instructors, self.start_date
+            )
+            self.show_heatmap_paging(None)
 
         else:
-            # When filter is off, get all instructors
-            selected_instructors = app_tables.users.search(tables.order_by("display_order", ascending=True), is_instructor=True)
+            # When filter is off, show all instructors a page at a time
+            # (the first page can come with the bootstrap)
+            if page is None:
+                page = anvil.server.call(
+                    "get_heatmap_page", self.start_date, self.heatmap_offset
+                )
+            data = page["heatmap"]
             self.instructor_list.visible = True
-
-        # Get data from server
-
-        data = anvil.server.call(
-            "process_instructor_availability", selected_instructors, self.start_date
-        )
+            self.show_heatmap_paging(page)
 
         if not data:
             self.schedule_plot_complete.visible = False
             print("no data to show")
             return
  
-        text_matrix = []
-        for row in data["z_values"]:
-            text_row = []
-            for val in row:
-                if val == 0:
-                    text_row.append("No")
-                elif val == 1:
-                    text_row.append("Any")
-                elif val == 2:
-                    text_row.append("Drive<br>Only")
-                elif val == 3:
-                    text_row.append("Class<br>Only")
-                elif val == 4:
-                    text_row.append("Scheduled")
-                elif val == 5:
-                    text_row.append("Booked")
-                elif val == 6:
-                    text_row.append("Vacation")
-                else:
-                    text_row.append("")
-            text_matrix.append(text_row)
+        # Cells hold integer codes; labels and colours come from the shared tables
+        text_matrix = [
+            ["" if code is None else HEATMAP_CODE_LABELS[code] for code in row]
+            for row in data["z_values"]
+        ]
+        max_code = len(HEATMAP_CODE_COLOURS) - 1
 
         fig = go.Figure(
             data=go.Heatmap(
@@ -130,13 +135,7 @@ class Scheduler(SchedulerTemplate):
                 x=data["x_labels"],
                 y=data["y_labels"],
                 colorscale=[
-                    [0 / 6, "grey"],  # 0: Not available
-                    [1 / 6, "purple"],  # 1: Available for both
-                    [2 / 6, "purple"],  # 2: Available for drives only
-                    [3 / 6, "purple"],  # 3: Available for classes only
-                    [4 / 6, "blue"],  # 4: Allocated to classroom slot
-                    [5 / 6, "blue"],  # 5: Booked
-                    [6 / 6, "grey"],  # 6: Vacation
+                    [code / max_code, colour] for code, colour in enumerate(HEATMAP_CODE_COLOURS)
                 ],
                 text=text_matrix,
                 texttemplate="%{text}",
@@ -145,7 +144,7 @@ class Scheduler(SchedulerTemplate):
                 showscale=False,
                 bgcolor="white",
                 zmin=0,
-                zmax=6,
+                zmax=max_code,
             )
         )
         # Update layout - keeping it very minimal
@@ -166,7 +165,40 @@ class Scheduler(SchedulerTemplate):
         self.schedule_plot_complete.figure = fig
         self.schedule_plot_complete.visible = True
 
+    def show_heatmap_paging(self, page):
+        """Page links and per-slot totals for the all-instructor view"""
+        paged = page is not None
+        self.previous_instructors_link.visible = paged
+        self.next_instructors_link.visible = paged
+        self.heatmap_totals_label.visible = paged
+        if not paged:
+            return
+
+        self.heatmap_limit = page["limit"]
+        last = min(page["offset"] + page["limit"], page["total"])
+        self.previous_instructors_link.enabled = page["offset"] > 0
+        self.next_instructors_link.enabled = last < page["total"]
+        if page["heatmap"]:
+            self.instructor_list.text = (
+                f"Instructors displayed ({page['offset'] + 1}-{last} of {page['total']}): "
+                f"{', '.join(page['heatmap']['instructors'])}"
+            )
+        self.heatmap_totals_label.text = "\n".join(
+            f"{label}: {drive} can drive, {class_} can teach a class"
+            for label, drive, class_ in zip(
+                page["y_labels"], page["drive_capable"], page["class_capable"]
+            )
+        )
+
 # Availability display navigation
+
+    def previous_instructors_link_click(self, **event_args):
+      self.heatmap_offset = max(0, self.heatmap_offset - self.heatmap_limit)
+      self.refresh_schedule_display(self.start_date)
+
+    def next_instructors_link_click(self, **event_args):
+      self.heatmap_offset += self.heatmap_limit
+      self.refresh_schedule_display(self.start_date)
   
     def forward_day_button_click(self, **event_args):
       new_start_date = self.start_date + timedelta(days=1)
@@ -228,8 +260,8 @@ class Scheduler(SchedulerTemplate):
             return
         start_date = datetime.strptime(self.start_date, "%m-%d-%Y").date()
 
-        task_id = str(uuid.uuid4())
-        anvil.server.call("create_full_classroom_schedule", school, start_date, task_id, num_students=None, classroom_type=None)
+        # The server queues the build and hands back the ID of any identical build already in progress
+        task_id = anvil.server.call("create_full_classroom_schedule", school, start_date, num_students=None, classroom_type=None)
         self.set_and_monitor_background_task(task_id)
         print("Running background classroom builder")
   
@@ -248,32 +280,43 @@ class Scheduler(SchedulerTemplate):
           alert(content = "There was an error downloading your report. Please try again", large=True, dismissible=True)
 
     def check_for_background_task(self,task_id):
+      # The server holds each call open until the task reports new progress or finishes,
+      # so results arrive within a second of completion without a fixed polling interval
+      last_version = None
+      retry_delay = 0
       while True:
-        row = app_tables.background_tasks_table.get(task_id=task_id)
-        if row is None:
+        try:
+          progress = anvil.server.call_s("get_task_progress", task_id, last_version)
+        except anvil.server.AppOfflineError:
+          # Back off on connection problems rather than hammering the server
+          retry_delay = min(retry_delay * 2 or 1, 30)
+          sleep(retry_delay)
+          continue
+        retry_delay = 0
+
+        if progress is None:
           alert("Task was not initiated properly. Please try again.", large=True, dismissible=True)
           return
-    
-        status = row['status']
-    
-        if status in ('complete', 'error'):
-          results_message = row['results_text']
-          alert(content=results_message, large=True, dismissible=True)
+
+        if progress['status'] in ('complete', 'error'):
+          self.task_progress_label.visible = False
+          alert(content=progress['results_text'], large=True, dismissible=True)
           return
-    
-        sleep(30)
+
+        if progress['version'] != last_version:
+          last_version = progress['version']
+          self.show_task_progress(progress)
+
+    def show_task_progress(self, progress):
+        message = f"{progress['phase']} ({progress['percent']}%)"
+        if progress['eta_seconds']:
+          message += f" - about {progress['eta_seconds']} seconds remaining"
+        self.task_progress_label.text = message
+        self.task_progress_label.visible = True
 
     def set_and_monitor_background_task(self,task_id):
-        now = datetime.now()
-        app_tables.background_tasks_table.add_row(
-          start_time=now,
-          status='running',
-          task_id=task_id
-        )
-  
         n =Notification("Your task is running and you will receive an alert when it is complete")
         n.show()
-        sleep(5)
         self.check_for_background_task(task_id)
 
     
@@ -311,24 +354,18 @@ class Scheduler(SchedulerTemplate):
       self.classroom_name_label.text = f"Classroom selected: School - {classroom['school']}, Start date - {classroom['start_date']}"
       self.classroom = classroom
     
-      self.available_instructors = app_tables.users.search(is_instructor=True)
-      self.available_instructors_school = []
-    
-      for instructor in self.available_instructors:
-        # instructor here is a user row (users table)
-        schedule = app_tables.instructor_schedules.get(instructor=instructor)
-        if schedule and self.classroom['school'] not in schedule['school_preferences'].get('no', []):
-          self.available_instructors_school.append(instructor)
+      # One server call; school preferences are filtered server-side
+      eligible = anvil.server.call("get_eligible_instructors", classroom['school'])
+      self.available_instructors_school = [item['instructor'] for item in eligible]
 
-      
       # Now build the dropdown list using names from the users table
       instructor_items_school = [
         {
-          'value': instructor,                  # actual row object for internal use
-          'label': instructor['firstName'],     # not used for display in this component
-          'key': instructor['firstName']        # Use firstName as the display text
+          'value': item['instructor'],          # actual row object for internal use
+          'label': item['firstName'],           # not used for display in this component
+          'key': item['firstName']              # Use firstName as the display text
         }
-        for instructor in self.available_instructors_school
+        for item in eligible
       ]
       
       self.instructor_schedule_multi_select.items = instructor_items_school
@@ -374,14 +411,12 @@ class Scheduler(SchedulerTemplate):
         self.instructor_alert_box.text = "Please select three instructors"
         return
       print("Scheduling instructors")
-      task_id = str(uuid.uuid4())
-      anvil.server.call(
+      task_id = anvil.server.call(
         "schedule_instructors_for_classroom",
         self.classroom['classroom_name'],
         self.instructor_1,
         self.instructor_2,
-        self.instructor_3, 
-        task_id
+        self.instructor_3,
       )
       self.set_and_monitor_background_task(task_id)
 
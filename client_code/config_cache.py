@@ -0,0 +1,23 @@
+import anvil.server
+
+# Session copy of the app config, keyed by its config_version.
+# get_config() only calls the server when there is no copy yet or a newer
+# version has been seen (e.g. in the Scheduler bootstrap).
+_config = None
+_config_version = None
+
+
+def get_config():
+    global _config, _config_version
+    if _config is None:
+        result = anvil.server.call("get_client_config", _config_version)
+        _config_version = result["config_version"]
+        _config = result["config"]
+    return _config
+
+
+def check_version(config_version):
+    """Drop the session copy if the server reports a different config_version."""
+    global _config
+    if config_version != _config_version:
+        _config = None
@@ -18,20 +18,23 @@ class ItemTemplate2(ItemTemplate2Template):
 
 
   def download_link_click(self, **event_args):
-    file = self.item['file']
+    # Media is only fetched from the server when it is downloaded
+    file = anvil.server.call('get_file_media', self.item['id'])
     anvil.media.download(file)
 
   def convert_link_click(self, **event_args):
     print(self.item['filename'])
-    anvil.server.call('convert_csv_to_json', self.item['file'])
+    file = anvil.server.call('get_file_media', self.item['id'])
+    anvil.server.call('convert_csv_to_json', file)
 
   def delete_file_link_click(self, **event_args):
-    file_name = self.item['filename']
-    file_row = app_tables.files.get(filename=file_name)
-    c = confirm(f"Confirm you want to delete file {file_row['filename']}")
+    c = confirm(f"Confirm you want to delete file {self.item['filename']}")
     if c is True:
-      file_row.delete()
+      try:
+        anvil.server.call('delete_file', self.item['id'])
+      except anvil.server.PermissionDenied:
+        alert("Only admins can delete files")
+        return
       open_form('Frame','file_transfer')
     
     
-
@@ -8,6 +8,7 @@ import anvil.tables as tables
 import anvil.tables.query as q
 from anvil.tables import app_tables
 import anvil.media
+from datetime import datetime
 
 
 class file_transfer(file_transferTemplate):
@@ -16,8 +17,36 @@ class file_transfer(file_transferTemplate):
     self.init_components(**properties)
     self.file_contents_drop_down.items = ["User Schedule", "User Profile", "Group Schedule"]
     self.upload_file = None  # Initialize file variable
-    self.file_repeating_panel.items = app_tables.files.search()
-    
+
+    # Files are listed a page at a time, without their media
+    self.page = 0
+    self.file_type_filter.items = [("All files", None)] + [
+      (file_type, file_type)
+      for file_type in ["Excel", "CSV", "User Schedule", "User Profile", "Group Schedule"]
+    ]
+    self.load_files_page()
+
+  def load_files_page(self):
+    listing = anvil.server.call(
+      "list_files", self.page, file_type=self.file_type_filter.selected_value
+    )
+    self.file_repeating_panel.items = listing["files"]
+    self.previous_page_link.enabled = self.page > 0
+    self.next_page_link.enabled = listing["has_more"]
+    self.page_label.text = f"Page {self.page + 1}"
+
+  def file_type_filter_change(self, **event_args):
+    self.page = 0
+    self.load_files_page()
+
+  def previous_page_link_click(self, **event_args):
+    self.page -= 1
+    self.load_files_page()
+
+  def next_page_link_click(self, **event_args):
+    self.page += 1
+    self.load_files_page()
+
   def file_uploader_change(self, file, **event_args):
     self.upload_file_name.text = file.name
     self.upload_file = file  # Store file in class variable
@@ -28,10 +57,33 @@ class file_transfer(file_transferTemplate):
       app_tables.files.add_row(
         filename=filename, 
         file=self.upload_file, 
-        file_type=self.file_contents_drop_down.selected_value
+        file_type=self.file_contents_drop_down.selected_value,
+        created=datetime.now()
       )
+      if self.file_contents_drop_down.selected_value == "User Schedule":
+        self.show_import_report(
+          anvil.server.call("import_availability_csv", self.upload_file)
+        )
       self.upload_file = None
       self.upload_file_name.text = ""
+      self.page = 0
+      self.load_files_page()
+
+  def show_import_report(self, report):
+    lines = [
+      f"{len(report['updated'])} availability rows imported, "
+      f"{len(report['rejected'])} rejected."
+    ]
+    for rejected in report["rejected"]:
+      lines.append(
+        f"Line {rejected['line']} ({rejected['row_header']}) rejected: "
+        + "; ".join(rejected["errors"])
+      )
+    for warned in report["warnings"]:
+      lines.append(
+        f"Line {warned['line']} ({warned['row_header']}): " + "; ".join(warned["warnings"])
+      )
+    alert("\n".join(lines), title="Availability import", large=True)
 
   def close_button_click(self, **event_args):
     from ..Frame import Frame
@@ -7,62 +7,79 @@ import anvil.tables.query as q
 from anvil.tables import app_tables
 
 # time_slot_5 is extended as the evening drive and class start times differ
+# Typed records as app_config.typed_slot_record produces (term / vacation are day lists)
 LESSON_SLOTS = {
   "break_am": {
-    "term": "all",
+    "term": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
     "end_time": "10:15",
+    "end_minute": 615,
     "seasonal": "no",
-    "vacation": "all",
-    "start_time": "10:00"
+    "vacation": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "start_time": "10:00",
+    "start_minute": 600
   },
   "break_pm": {
-    "term": "all",
+    "term": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
     "end_time": "15:45",
+    "end_minute": 945,
     "seasonal": "no",
-    "vacation": "all",
-    "start_time": "15:30"
+    "vacation": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "start_time": "15:30",
+    "start_minute": 930
   },
   "break_lunch": {
-    "term": "all",
+    "term": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
     "end_time": "13:30",
+    "end_minute": 810,
     "seasonal": "no",
-    "vacation": "all",
-    "start_time": "12:30"
+    "vacation": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "start_time": "12:30",
+    "start_minute": 750
   },
   "lesson_slot_1": {
-    "term": "Sat, Sun",
+    "term": ["Saturday", "Sunday"],
     "end_time": "10:00",
+    "end_minute": 600,
     "seasonal": "no",
-    "vacation": "all",
-    "start_time": "08:00"
+    "vacation": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "start_time": "08:00",
+    "start_minute": 480
   },
   "lesson_slot_2": {
-    "term": "Sat, Sun",
+    "term": ["Saturday", "Sunday"],
     "end_time": "12:15",
+    "end_minute": 735,
     "seasonal": "no",
-    "vacation": "all",
-    "start_time": "10:15"
+    "vacation": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "start_time": "10:15",
+    "start_minute": 615
   },
   "lesson_slot_3": {
-    "term": "Sat, Sun",
+    "term": ["Saturday", "Sunday"],
     "end_time": "15:15",
+    "end_minute": 915,
     "seasonal": "no",
-    "vacation": "all",
-    "start_time": "13:15"
+    "vacation": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "start_time": "13:15",
+    "start_minute": 795
   },
   "lesson_slot_4": {
-    "term": "all",
+    "term": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
     "end_time": "17:45",
+    "end_minute": 1065,
     "seasonal": "no",
-    "vacation": "all",
-    "start_time": "15:45"
+    "vacation": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "start_time": "15:45",
+    "start_minute": 945
   },
   "lesson_slot_5": {
-    "term": "all",
+    "term": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
     "end_time": "20:30",
+    "end_minute": 1230,
     "seasonal": "no",
-    "vacation": "all",
-    "start_time": "18:00"
+    "vacation": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "start_time": "18:00",
+    "start_minute": 1080
   }
 }
 
@@ -88,6 +105,10 @@ AVAILABILITY_MAPPING = {
   "Vacation": 6,  # Personal vacation day
 }
 
+# Availability heatmap cell text and colour, indexed by AVAILABILITY_MAPPING code
+HEATMAP_CODE_LABELS = ["No", "Any", "Drive<br>Only", "Class<br>Only", "Scheduled", "Booked", "Vacation"]
+HEATMAP_CODE_COLOURS = ["grey", "purple", "purple", "purple", "blue", "blue", "grey"]
+
 # Course structure defining lesson pairs and sequence
 COURSE_STRUCTURE_COMPRESSED = {
     "orientation": {
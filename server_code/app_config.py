@@ -0,0 +1,250 @@
+"""
+App Config Module
+
+Reads the "latest" row of global_variables_edit_with_care once and caches it
+for the process, with typed accessors for each setting. Settings missing from
+the row fall back to the copies in globals.py. Server modules read lesson slot
+times and course structures through these accessors rather than importing the
+globals.py copies, so edits to the row take effect everywhere. Slot names and
+availability codes stay in globals.py, as stored availability is encoded with them.
+
+Lesson slot records are typed: start_time / end_time as 'HH:MM' with
+start_minute / end_minute ints, and term / vacation as lists of full day names
+('all' becomes all seven days). Records stored in the older string format are
+converted when the config is loaded, so every reader sees the typed form.
+
+The row's config_version is bumped whenever the config is written (see
+update_teen_drive_schedule), which drops this process's cache. Other processes
+reload after CONFIG_TTL seconds, and clients compare the version from
+get_client_config / the Scheduler bootstrap against the copy they hold.
+"""
+
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables, in_transaction
+from .globals import (
+    LESSON_SLOTS,
+    AVAILABILITY_MAPPING,
+    COURSE_STRUCTURE_COMPRESSED,
+    COURSE_STRUCTURE_STANDARD,
+    availability_codes as AVAILABILITY_CODES,
+    days_full as DAYS_FULL,
+    days_short as DAYS_SHORT,
+)
+from datetime import datetime
+import time
+
+# Seconds a loaded config is reused before the row is read again
+CONFIG_TTL = 60
+# Settings holding lesson slot records, converted to the typed format on load
+LESSON_SLOT_SETTINGS = (
+    "lesson_slots",
+    "current_teen_driving_schedule",
+    "previous_teen_driving_schedule",
+)
+
+_config = None
+_loaded_at = 0
+
+
+def _latest_row():
+    return app_tables.global_variables_edit_with_care.get(version="latest")
+
+
+###########################################################
+# Lesson slot records
+
+
+def coerce_time(value):
+    """'8:00', '08:00' or '8:00 AM' -> '08:00' (24 hour, zero padded)"""
+    value = value.strip()
+    for time_format in ("%H:%M", "%I:%M %p", "%I:%M%p", "%H:%M:%S"):
+        try:
+            return datetime.strptime(value, time_format).strftime("%H:%M")
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time '{value}'")
+
+
+def coerce_day_list(value):
+    """
+    'Sat, Sun' -> ['Saturday', 'Sunday'], 'all' -> every day of the week.
+    Each day must be a prefix of exactly one day name, so 't' or 's' is refused.
+    """
+    value = value.strip()
+    if value.lower() == "all":
+        return list(DAYS_FULL)
+    days = []
+    for token in value.split(","):
+        token = token.strip().lower()
+        matches = [day for day in DAYS_FULL if token and day.lower().startswith(token)]
+        if len(matches) != 1:
+            raise ValueError(f"Unrecognised day '{token}'")
+        days.append(matches[0])
+    return days
+
+
+def time_to_minutes(value):
+    """'HH:MM' -> minutes after midnight, for cheap slot time comparisons"""
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def typed_slot_record(slot_info):
+    """A lesson slot record in the typed format, converting string term / vacation days."""
+    record = dict(slot_info)
+    for column in ("term", "vacation"):
+        if isinstance(record.get(column), str):
+            record[column] = coerce_day_list(record[column])
+    for column, minute_column in (("start_time", "start_minute"), ("end_time", "end_minute")):
+        if record.get(column):
+            record[column] = coerce_time(record[column])
+            record[minute_column] = time_to_minutes(record[column])
+    return record
+
+
+def typed_lesson_slots(slots):
+    return {slot_name: typed_slot_record(slot_info) for slot_name, slot_info in slots.items()}
+
+
+###########################################################
+# Config row
+
+
+def get_config():
+    """The latest config row as a dict (with config_version), cached per process."""
+    global _config, _loaded_at
+    if _config is None or time.monotonic() - _loaded_at > CONFIG_TTL:
+        row = _latest_row()
+        config = dict(row) if row else {}
+        config["config_version"] = config.get("config_version") or 0
+        for name in LESSON_SLOT_SETTINGS:
+            if config.get(name):
+                config[name] = typed_lesson_slots(config[name])
+        _config = config
+        _loaded_at = time.monotonic()
+    return _config
+
+
+def invalidate_config():
+    global _config
+    _config = None
+
+
+def config_version():
+    return get_config()["config_version"]
+
+
+def _setting(name, default):
+    value = get_config().get(name)
+    return default if value is None else value
+
+
+def lesson_slots():
+    return _setting("lesson_slots", LESSON_SLOTS)
+
+
+def teen_driving_schedule():
+    """Lesson slot records from the most recent teen driving schedule upload."""
+    return _setting("current_teen_driving_schedule", LESSON_SLOTS)
+
+
+def availability_codes():
+    return _setting("availability_codes", AVAILABILITY_CODES)
+
+
+def instructor_availability_codes():
+    return _setting("instructor_availability_codes", AVAILABILITY_CODES)
+
+
+def availability_mapping():
+    return _setting("availability_mapping", AVAILABILITY_MAPPING)
+
+
+def days_full():
+    return _setting("days_full", DAYS_FULL)
+
+
+def days_short():
+    return _setting("days_short", DAYS_SHORT)
+
+
+def course_structure(compressed=False):
+    if compressed:
+        return _setting("course_structure_compressed", COURSE_STRUCTURE_COMPRESSED)
+    return _setting("course_structure_standard", COURSE_STRUCTURE_STANDARD)
+
+
+def _write_config(row, settings):
+    if row:
+        version = (row["config_version"] or 0) + 1
+        row.update(config_version=version, **settings)
+    else:
+        version = 1
+        app_tables.global_variables_edit_with_care.add_row(
+            version="latest", config_version=version, **settings
+        )
+    invalidate_config()
+    return version
+
+
+@in_transaction
+def update_config(**settings):
+    """
+    Write settings to the latest config row and bump its config_version,
+    in one transaction.
+
+    Returns:
+        int: The new config_version
+    """
+    return _write_config(_latest_row(), settings)
+
+
+@in_transaction
+def replace_teen_driving_schedule(schedule):
+    """
+    Make schedule the current teen driving schedule, keeping the one it
+    replaces as the previous schedule.
+
+    Returns:
+        int: The new config_version
+    """
+    row = _latest_row()
+    previous = row["current_teen_driving_schedule"] if row else None
+    return _write_config(
+        row,
+        {
+            "previous_teen_driving_schedule": previous,
+            "current_teen_driving_schedule": schedule,
+        },
+    )
+
+
+@anvil.server.callable
+def get_client_config(known_version=None):
+    """
+    Config for client forms.
+
+    Args:
+        known_version (int): config_version the client already holds
+
+    Returns:
+        dict: config_version, unchanged and (if changed) the config settings
+    """
+    config = get_config()
+    if config["config_version"] == known_version:
+        return {"config_version": known_version, "unchanged": True}
+    return {
+        "config_version": config["config_version"],
+        "unchanged": False,
+        "config": {
+            "current_teen_driving_schedule": teen_driving_schedule(),
+            "instructor_availability_codes": instructor_availability_codes(),
+            "availability_codes": availability_codes(),
+            "availability_mapping": availability_mapping(),
+            "lesson_slots": lesson_slots(),
+            "days_full": days_full(),
+            "days_short": days_short(),
+        },
+    }
@@ -0,0 +1,174 @@
+"""
+App Logging Module
+
+Levelled, structured logging for server code, used in place of print().
+
+- Levels: DEBUG < INFO < WARNING < ERROR. Only records at LOG_LEVEL or above
+  are printed to the Anvil app log.
+- Debug calls are replaced with a no-op at import time unless LOG_LEVEL is
+  DEBUG, and messages use %-style arguments so nothing is formatted for a
+  record that isn't emitted. Guard expensive arguments with DEBUG_ENABLED.
+- Sampling: pass every=N to emit only one in N records for a given message,
+  for warnings that can fire once per slot inside a loop.
+- Correlation IDs: background tasks call set_correlation_id(task_id) so every
+  record from the task can be traced back to it.
+- Records at STORE_LEVEL or above are also buffered and written to the
+  app_logs table, where get_logs() can query them.
+
+Usage:
+    from .app_logging import get_logger, DEBUG_ENABLED
+    log = get_logger(__name__)
+    log.info("Scheduled %s drives", len(drives), classroom=classroom_name)
+    log.warning("Error with slot %s: %s", slot_name, e, every=50)
+"""
+
+import anvil.server
+import anvil.tz
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables
+from datetime import datetime
+import json
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+# Lowest level printed to the app log; set to DEBUG while developing
+LOG_LEVEL = INFO
+# Lowest level also stored in the app_logs table
+STORE_LEVEL = WARNING
+# Buffered records are written once this many have built up (or at ERROR)
+LOG_FLUSH_SIZE = 50
+
+DEBUG_ENABLED = LOG_LEVEL <= DEBUG
+
+_correlation_id = None
+_pending_records = []
+_sample_counts = {}
+
+
+def set_correlation_id(correlation_id):
+    """Tag all following records in this process, e.g. with a background task ID."""
+    global _correlation_id
+    _correlation_id = correlation_id
+
+
+def get_correlation_id():
+    return _correlation_id
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+class Logger:
+    def __init__(self, name):
+        self.name = name.rsplit(".", 1)[-1]
+
+    def debug(self, message, *args, every=None, **fields):
+        self._log(DEBUG, message, args, every, fields)
+
+    def info(self, message, *args, every=None, **fields):
+        self._log(INFO, message, args, every, fields)
+
+    def warning(self, message, *args, every=None, **fields):
+        self._log(WARNING, message, args, every, fields)
+
+    def error(self, message, *args, every=None, **fields):
+        self._log(ERROR, message, args, every, fields)
+
+    if not DEBUG_ENABLED:
+        debug = _noop
+
+    def _log(self, level, message, args, every, fields):
+        if level < LOG_LEVEL:
+            return
+
+        if every:
+            key = (self.name, message)
+            occurrences = _sample_counts.get(key, 0) + 1
+            _sample_counts[key] = occurrences
+            if (occurrences - 1) % every:
+                return
+            fields["occurrences"] = occurrences
+
+        text = message % args if args else message
+        suffix = f" {json.dumps(fields, default=str)}" if fields else ""
+        tag = f" [{_correlation_id}]" if _correlation_id else ""
+        print(f"{LEVEL_NAMES[level]} {self.name}{tag}: {text}{suffix}")
+
+        if level >= STORE_LEVEL:
+            _pending_records.append({
+                "time": datetime.now(anvil.tz.tzutc()),
+                "level": level,
+                "level_name": LEVEL_NAMES[level],
+                "logger": self.name,
+                "message": text,
+                "correlation_id": _correlation_id,
+                "data": json.loads(json.dumps(fields, default=str)) if fields else None,
+            })
+            if level >= ERROR or len(_pending_records) >= LOG_FLUSH_SIZE:
+                flush_logs()
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    if name not in _loggers:
+        _loggers[name] = Logger(name)
+    return _loggers[name]
+
+
+def flush_logs():
+    """Write buffered records to the app_logs table."""
+    if not _pending_records:
+        return
+    records = list(_pending_records)
+    _pending_records.clear()
+    try:
+        app_tables.app_logs.add_rows(records)
+    except Exception as e:
+        # Logging must never take down the code that's logging
+        print(f"Could not store {len(records)} log records: {e}")
+
+
+@anvil.server.callable(require_user=lambda user: user["is_admin"])
+def get_logs(correlation_id=None, min_level=WARNING, logger=None, since=None, limit=200):
+    """
+    Query stored log records, newest first. Admin users only.
+
+    Args:
+        correlation_id (str): Only records for this task
+        min_level (int): Lowest level to include
+        logger (str): Only records from this module, e.g. "classsroom_builder"
+        since (datetime): Only records at or after this time
+        limit (int): Maximum number of records returned
+
+    Returns:
+        list: Records as dicts (time, level_name, logger, message, correlation_id, data)
+    """
+    filters = {"level": q.greater_than_or_equal_to(min_level)}
+    if correlation_id:
+        filters["correlation_id"] = correlation_id
+    if logger:
+        filters["logger"] = logger
+    if since:
+        filters["time"] = q.greater_than_or_equal_to(since)
+
+    records = []
+    for row in app_tables.app_logs.search(tables.order_by("time", ascending=False), **filters):
+        if len(records) >= limit:
+            break
+        records.append({
+            "time": row["time"],
+            "level_name": row["level_name"],
+            "logger": row["logger"],
+            "message": row["message"],
+            "correlation_id": row["correlation_id"],
+            "data": row["data"],
+        })
+    return records
@@ -0,0 +1,101 @@
+"""
+Availability Bits Module
+
+Bitmask encoding of instructor availability.
+
+Each availability code maps to capability flags (CAN_DRIVE, CAN_CLASS,
+OCCUPIED), and an instructor's day packs into three ints with one bit per
+bookable slot (bit i = SLOT_NAMES[i]): drive-capable, class-capable and
+occupied. Questions across the roster then become OR/AND and popcounts, and
+for many instructors the masks go into a NumPy array and are reduced in one
+call.
+"""
+
+import numpy as np
+from .globals import AVAILABILITY_MAPPING
+from .schedule_records import SLOT_NAMES, SLOT_INDEX
+
+CAN_DRIVE = 1
+CAN_CLASS = 2
+OCCUPIED = 4
+
+# Availability code -> capability flags
+CODE_FLAGS = {
+    AVAILABILITY_MAPPING["No"]: 0,
+    AVAILABILITY_MAPPING["Yes"]: CAN_DRIVE | CAN_CLASS,
+    AVAILABILITY_MAPPING["Drive Only"]: CAN_DRIVE,
+    AVAILABILITY_MAPPING["Class Only"]: CAN_CLASS,
+    AVAILABILITY_MAPPING["Scheduled"]: OCCUPIED,
+    AVAILABILITY_MAPPING["Booked"]: OCCUPIED,
+    AVAILABILITY_MAPPING["Vacation"]: 0,
+}
+SLOT_BITS = {slot_name: 1 << i for slot_name, i in SLOT_INDEX.items()}
+ALL_SLOTS = (1 << len(SLOT_NAMES)) - 1
+# Set bits in every possible slot mask, for popcounts over NumPy arrays
+_POPCOUNT = np.array([bin(mask).count("1") for mask in range(ALL_SLOTS + 1)], dtype=np.int64)
+
+
+def status_flags(status):
+    """Capability flags for a numeric availability code or a status label such as "Drive Only"."""
+    if isinstance(status, str):
+        status = AVAILABILITY_MAPPING.get(status)
+    return CODE_FLAGS.get(status, 0)
+
+
+def day_masks(day_availability):
+    """
+    Pack one instructor's day into slot masks.
+
+    Args:
+        day_availability (dict): Slot name -> availability code or label
+
+    Returns:
+        tuple: (drive, class_, occupied) masks
+    """
+    drive = class_ = occupied = 0
+    for slot_name, status in (day_availability or {}).items():
+        bit = SLOT_BITS.get(slot_name)
+        if bit is None:
+            continue
+        flags = status_flags(status)
+        if flags & CAN_DRIVE:
+            drive |= bit
+        if flags & CAN_CLASS:
+            class_ |= bit
+        if flags & OCCUPIED:
+            occupied |= bit
+    return drive, class_, occupied
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+def roster_masks(day_availabilities):
+    """
+    Masks for many instructors' days as NumPy arrays.
+
+    Args:
+        day_availabilities (iterable): Slot name -> code dicts, one per instructor
+
+    Returns:
+        tuple: (drive, class_, occupied) uint32 arrays, one element per instructor
+    """
+    packed = [day_masks(day) for day in day_availabilities]
+    if not packed:
+        empty = np.zeros(0, dtype=np.uint32)
+        return empty, empty, empty
+    drive, class_, occupied = np.array(packed, dtype=np.uint32).T
+    return drive, class_, occupied
+
+
+def total_slots(masks):
+    """Set bits across every mask in the array, e.g. instructor drive slots in total."""
+    return int(_POPCOUNT[masks].sum())
+
+
+def covered_slots(masks):
+    """Slots where at least one mask has its bit set."""
+    if len(masks) == 0:
+        return 0
+    return popcount(int(np.bitwise_or.reduce(masks)))
@@ -0,0 +1,404 @@
+"""
+Background Tasks Module
+
+Queues and tracks long-running background tasks in background_tasks_table.
+Tasks are enqueued with an idempotency key and the resources they touch; a
+duplicate request returns the task already in flight, and a task only starts
+once no running task holds one of its resources and a concurrency slot is free.
+Tasks report staged progress (percent, phase, ETA) as they run, and the client
+follows them through get_task_progress, which long-polls the task row so that
+results show up as soon as the task finishes.
+
+Each task also records a TaskMetrics summary in the `metrics` column: time and
+table calls per stage plus the size of the payloads it wrote, so a slow build
+can be traced to the stage (or the database) responsible.
+
+Task states: queued -> running -> complete | error
+"""
+
+import anvil.server
+import anvil.tz
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables, in_transaction, count_table_calls
+from .app_logging import get_logger, flush_logs
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import json
+import time
+import uuid
+
+log = get_logger(__name__)
+
+# Seconds between row checks while get_task_progress is waiting
+PROGRESS_CHECK_INTERVAL = 0.5
+# Longest a single get_task_progress call holds the connection open
+PROGRESS_MAX_WAIT = 20
+
+# Most background tasks allowed to run at once; the rest wait as "queued"
+MAX_CONCURRENT_TASKS = 2
+# Running tasks older than this are assumed dead and stop holding their resources
+STALE_TASK_TIMEOUT = timedelta(hours=1)
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("complete", "error")
+
+
+def _now():
+    # Datetimes read back from data tables are timezone-aware, so compare in UTC
+    return datetime.now(anvil.tz.tzutc())
+
+
+@in_transaction
+def _add_task_if_new(task_name, task_args, idempotency_key, resource_keys):
+    """
+    Find an active task with the same idempotency key, or add a new queued task row.
+
+    Returns:
+        tuple: (task_id, created) - created is False when an existing task was found
+    """
+    existing = app_tables.background_tasks_table.search(
+        idempotency_key=idempotency_key, status=q.any_of(*ACTIVE_STATUSES)
+    )
+    if len(existing) > 0:
+        return existing[0]["task_id"], False
+
+    task_id = str(uuid.uuid4())
+    app_tables.background_tasks_table.add_row(
+        task_id=task_id,
+        task_name=task_name,
+        task_args=task_args,
+        idempotency_key=idempotency_key,
+        resource_keys=resource_keys,
+        status="queued",
+        queued_time=_now(),
+        progress={
+            "percent": 0,
+            "phase": "Queued",
+            "eta_seconds": None,
+            "version": 0,
+        },
+    )
+    return task_id, True
+
+
+def enqueue_task(task_name, task_args, idempotency_key, resource_keys):
+    """
+    Queue a background task and start it if a slot and its resources are free.
+    Repeated requests with the same idempotency key while a task is queued or
+    running return that task instead of launching a duplicate.
+
+    Args:
+        task_name (str): Name of the @anvil.server.background_task function
+        task_args (dict): Keyword arguments for the task (must be simpleObject-safe)
+        idempotency_key (str): Identifies requests that would do the same work
+        resource_keys (list): Resources the task writes to, e.g. "instructor:<id>"
+
+    Returns:
+        str: ID of the new or existing task
+    """
+    task_id, created = _add_task_if_new(
+        task_name, task_args, idempotency_key, resource_keys
+    )
+    if not created:
+        log.info("Task %s already in progress as %s", idempotency_key, task_id)
+    _launch_ready_tasks()
+    return task_id
+
+
+@in_transaction
+def _claim_ready_tasks():
+    """
+    Move as many queued tasks to running as concurrency and resource locks allow.
+    Returns the claimed rows; the caller launches them outside the transaction.
+    """
+    now = _now()
+    running = []
+    for task_row in app_tables.background_tasks_table.search(status="running"):
+        started = task_row["start_time"]
+        if started and now - started > STALE_TASK_TIMEOUT:
+            task_row.update(
+                status="error", results_text="Task timed out", end_time=now
+            )
+        else:
+            running.append(task_row)
+
+    locked = set()
+    for task_row in running:
+        locked.update(task_row["resource_keys"] or [])
+
+    free_slots = MAX_CONCURRENT_TASKS - len(running)
+    claimed = []
+    queued = app_tables.background_tasks_table.search(
+        tables.order_by("queued_time", ascending=True), status="queued"
+    )
+    for task_row in queued:
+        if free_slots <= 0:
+            break
+        resource_keys = set(task_row["resource_keys"] or [])
+        if resource_keys & locked:
+            continue
+        progress = task_row["progress"] or {}
+        task_row.update(
+            status="running",
+            start_time=now,
+            progress={
+                "percent": 0,
+                "phase": "Starting",
+                "eta_seconds": None,
+                "version": progress.get("version", 0) + 1,
+            },
+        )
+        locked.update(resource_keys)
+        free_slots -= 1
+        claimed.append(task_row)
+    return claimed
+
+
+def _launch_ready_tasks():
+    for task_row in _claim_ready_tasks():
+        try:
+            anvil.server.launch_background_task(
+                task_row["task_name"],
+                task_id=task_row["task_id"],
+                **(task_row["task_args"] or {}),
+            )
+        except Exception as e:
+            finish_task(task_row["task_id"], "error", f"Could not start task: {e}")
+
+
+class TaskMetrics:
+    """
+    Collects stage timings, table-call counts and payload sizes for one task run.
+
+    Usage:
+        metrics = TaskMetrics()
+        with metrics.stage("capacity"):
+            ...
+        metrics.record_payload("drive_schedule", drives)
+        finish_task(task_id, "complete", message, metrics=metrics)
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.stages = []
+        self.payload_bytes = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        with count_table_calls() as calls:
+            try:
+                yield
+            finally:
+                self.stages.append({
+                    "name": name,
+                    "seconds": round(time.perf_counter() - start, 3),
+                    "table_calls": calls.total,
+                    "table_calls_by_operation": calls.by_operation(),
+                })
+
+    def record_payload(self, name, value):
+        """Record the serialised size of something written to a table row."""
+        self.payload_bytes[name] = len(json.dumps(value, default=str))
+
+    def as_dict(self):
+        return {
+            "total_seconds": round(time.perf_counter() - self._start, 3),
+            "table_calls": sum(stage["table_calls"] for stage in self.stages),
+            "stages": self.stages,
+            "payload_bytes": self.payload_bytes,
+        }
+
+
+def task_timing(task_row):
+    """Seconds spent queued and running for a task row (None where not yet known)."""
+    queued_seconds = running_seconds = None
+    queued, started, ended = (
+        task_row["queued_time"],
+        task_row["start_time"],
+        task_row["end_time"],
+    )
+    if queued and started:
+        queued_seconds = (started - queued).total_seconds()
+    if started and ended:
+        running_seconds = (ended - started).total_seconds()
+    return queued_seconds, running_seconds
+
+
+def report_progress(task_id, percent, phase):
+    """
+    Record a progress stage for a running task.
+    Also mirrors the progress into anvil.server.task_state for callers holding the Task.
+
+    Args:
+        task_id (str): ID of the task row
+        percent (int): Completion from 0 to 100
+        phase (str): Human readable description of the current stage
+    """
+    task_row = app_tables.background_tasks_table.get(task_id=task_id)
+    if not task_row:
+        return
+
+    eta_seconds = None
+    if task_row["start_time"] and 0 < percent < 100:
+        elapsed = (_now() - task_row["start_time"]).total_seconds()
+        eta_seconds = int(elapsed * (100 - percent) / percent)
+
+    previous = task_row["progress"] or {}
+    progress = {
+        "percent": int(percent),
+        "phase": phase,
+        "eta_seconds": eta_seconds,
+        "version": previous.get("version", 0) + 1,
+    }
+    task_row.update(progress=progress)
+
+    try:
+        anvil.server.task_state["progress"] = progress
+    except Exception:
+        # Not running inside a background task
+        pass
+
+
+def finish_task(task_id, status, results_text, output_filename=None, metrics=None):
+    """Mark a task as complete or errored and store its results (and TaskMetrics, if given)."""
+    task_row = app_tables.background_tasks_table.get(task_id=task_id)
+    if not task_row:
+        return
+
+    previous = task_row["progress"] or {}
+    task_row.update(
+        status=status,
+        results_text=results_text,
+        end_time=_now(),
+        output_filename=output_filename,
+        metrics=metrics.as_dict() if metrics else None,
+        progress={
+            "percent": 100,
+            "phase": "Finished" if status == "complete" else "Failed",
+            "eta_seconds": 0,
+            "version": previous.get("version", 0) + 1,
+        },
+    )
+
+    flush_logs()
+
+    # A slot and this task's resources are now free
+    _launch_ready_tasks()
+
+
+def _task_snapshot(task_row):
+    progress = task_row["progress"] or {}
+    queued_seconds, running_seconds = task_timing(task_row)
+    return {
+        "task_id": task_row["task_id"],
+        "status": task_row["status"],
+        "queued_seconds": queued_seconds,
+        "running_seconds": running_seconds,
+        "percent": progress.get("percent", 0),
+        "phase": progress.get("phase"),
+        "eta_seconds": progress.get("eta_seconds"),
+        "version": progress.get("version", 0),
+        "results_text": task_row["results_text"],
+        "output_filename": task_row["output_filename"],
+    }
+
+
+@anvil.server.callable
+def get_task_progress(task_id, last_version=None, wait=PROGRESS_MAX_WAIT):
+    """
+    Long-poll a task's progress.
+    Returns as soon as the task has moved past last_version or finished,
+    or after `wait` seconds with the current state.
+
+    Args:
+        task_id (str): ID of the task row
+        last_version (int): Progress version the caller has already seen
+        wait (float): Maximum seconds to wait for a change
+
+    Returns:
+        dict: Task status, percent, phase, ETA and results, or None if the task doesn't exist
+    """
+    wait = min(wait, PROGRESS_MAX_WAIT)
+    deadline = time.time() + wait
+    while True:
+        task_row = app_tables.background_tasks_table.get(task_id=task_id)
+        if task_row is None:
+            return None
+
+        snapshot = _task_snapshot(task_row)
+        if (
+            snapshot["status"] in FINISHED_STATUSES
+            or snapshot["version"] != last_version
+            or time.time() >= deadline
+        ):
+            return snapshot
+
+        time.sleep(PROGRESS_CHECK_INTERVAL)
+
+
+@anvil.server.callable(require_user=lambda user: user["is_admin"])
+def get_recent_task_metrics(task_name=None, limit=20):
+    """
+    Summarise the metrics of recently finished tasks.
+
+    Args:
+        task_name (str): Only include tasks of this name
+        limit (int): Number of most recent tasks to include
+
+    Returns:
+        dict: "runs" (one summary per task, newest first) and "stages"
+              (count, mean and max seconds and mean table calls per task name and stage)
+    """
+    filters = {"status": q.any_of(*FINISHED_STATUSES)}
+    if task_name:
+        filters["task_name"] = task_name
+    task_rows = app_tables.background_tasks_table.search(
+        tables.order_by("queued_time", ascending=False), **filters
+    )
+
+    runs = []
+    stage_totals = {}
+    for task_row in task_rows:
+        if len(runs) >= limit:
+            break
+        metrics = task_row["metrics"]
+        if not metrics:
+            continue
+        queued_seconds, running_seconds = task_timing(task_row)
+        slowest = max(metrics["stages"], key=lambda s: s["seconds"], default=None)
+        runs.append({
+            "task_id": task_row["task_id"],
+            "task_name": task_row["task_name"],
+            "status": task_row["status"],
+            "queued_time": task_row["queued_time"],
+            "queued_seconds": queued_seconds,
+            "running_seconds": running_seconds,
+            "table_calls": metrics["table_calls"],
+            "slowest_stage": slowest["name"] if slowest else None,
+            "stages": metrics["stages"],
+            "payload_bytes": metrics["payload_bytes"],
+        })
+        for stage in metrics["stages"]:
+            key = (task_row["task_name"], stage["name"])
+            totals = stage_totals.setdefault(
+                key, {"count": 0, "seconds": 0, "max_seconds": 0, "table_calls": 0}
+            )
+            totals["count"] += 1
+            totals["seconds"] += stage["seconds"]
+            totals["max_seconds"] = max(totals["max_seconds"], stage["seconds"])
+            totals["table_calls"] += stage["table_calls"]
+
+    stages = [
+        {
+            "task_name": name,
+            "stage": stage,
+            "count": totals["count"],
+            "mean_seconds": round(totals["seconds"] / totals["count"], 3),
+            "max_seconds": totals["max_seconds"],
+            "mean_table_calls": round(totals["table_calls"] / totals["count"], 1),
+        }
+        for (name, stage), totals in stage_totals.items()
+    ]
+    return {"runs": runs, "stages": stages}
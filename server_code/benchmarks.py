@@ -0,0 +1,257 @@
+"""
+Benchmarks Module
+
+Times the classroom build pipeline on synthetic data using the in-memory
+tables backend from data_access, so runs are repeatable and need no live app.
+
+For each combination of instructor count, student count and course type it
+records, per stage: wall time, number of table calls and peak Python memory.
+Results are written as JSON; compare_benchmarks() lines up two result files
+so a regression shows up as a ratio against the previous version.
+
+This is a command-line tool only. use_backend() swaps the tables for the whole
+process, so it must never run inside the live server.
+
+Run locally (from the directory containing the app package):
+    python -m Driving_Scheduler.benchmarks --output bench.json
+    python -m Driving_Scheduler.benchmarks --compare old.json bench.json
+"""
+
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import io
+import json
+import platform
+import time
+import tracemalloc
+from .data_access import use_backend, memory_backend_from_examples, count_table_calls
+from .globals import COURSE_STRUCTURE_COMPRESSED, COURSE_STRUCTURE_STANDARD
+from . import classsroom_builder
+from . import utilities_server
+
+INSTRUCTOR_COUNTS = [5, 25, 50, 100, 200]
+STUDENT_COUNTS = [10, 20, 30, 40, 60]
+COURSE_TYPES = {
+    "standard": COURSE_STRUCTURE_STANDARD,
+    "compressed": COURSE_STRUCTURE_COMPRESSED,
+}
+
+
+class _Stage:
+    """Measures one stage: wall time, table calls and peak traced memory."""
+
+    def __init__(self, results, name):
+        self.results = results
+        self.name = name
+
+    def __enter__(self):
+        self._calls = count_table_calls()
+        self._counter = self._calls.__enter__()
+        tracemalloc.reset_peak()
+        self._start_memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._start
+        peak = tracemalloc.get_traced_memory()[1]
+        self._calls.__exit__(*exc_info)
+        self.results[self.name] = {
+            "seconds": round(seconds, 6),
+            "table_calls": self._counter.total,
+            "table_calls_by_operation": self._counter.by_operation(),
+            "peak_memory_kb": round(max(peak - self._start_memory, 0) / 1024, 1),
+        }
+        return False
+
+
+def _next_monday():
+    today = datetime.now().date()
+    return today + timedelta(days=(7 - today.weekday()) % 7 or 7)
+
+
+def run_pipeline(num_instructors, num_students, course_type, start_date=None, school="HSS"):
+    """
+    Run the classroom build pipeline once against a fresh in-memory backend.
+
+    Args:
+        num_instructors (int): Synthetic instructors to seed
+        num_students (int): Students in the classroom
+        course_type (str): "standard" or "compressed"
+        start_date (date): Classroom start date (defaults to next Monday)
+        school (str): School abbreviation
+
+    Returns:
+        dict: Run parameters and per-stage measurements
+    """
+    course_structure = COURSE_TYPES[course_type]
+    start_date = start_date or _next_monday()
+    use_backend(memory_backend_from_examples(num_instructors, start_date))
+
+    stages = {}
+    run_start = time.perf_counter()
+    try:
+        with _Stage(stages, "get_available_days"):
+            classsroom_builder.get_available_days(start_date, course_structure)
+
+        with _Stage(stages, "calculate_weekly_capacity"):
+            classsroom_builder.calculate_weekly_capacity(start_date, school, course_structure)
+
+        with _Stage(stages, "create_classroom"):
+            classroom_name = classsroom_builder.generate_classroom_name(school, start_date)
+            classsroom_builder.create_ghost_students(classroom_name, num_students)
+
+        with _Stage(stages, "schedule_classes"):
+            classes, occupied_slots = classsroom_builder.schedule_classes(
+                classroom_name, start_date, num_students, course_structure
+            )
+
+        with _Stage(stages, "schedule_drives"):
+            drives = classsroom_builder.schedule_drives(
+                classroom_name, start_date, num_students, course_structure, occupied_slots
+            )
+
+        with _Stage(stages, "create_merged_schedule"):
+            complete_schedule = classsroom_builder.create_merged_schedule(
+                classroom_name, classes, drives
+            )
+            classroom_row = classsroom_builder.app_tables.classrooms.get(
+                classroom_name=classroom_name
+            )
+            classroom_row.update(complete_schedule=complete_schedule)
+
+        with _Stage(stages, "export_merged_classroom_schedule"):
+            utilities_server.export_merged_classroom_schedule(classroom_name, "lessons")
+    finally:
+        use_backend(None)
+
+    return {
+        "instructors": num_instructors,
+        "students": num_students,
+        "course_type": course_type,
+        "num_classes": len(classes),
+        "num_drives": len(drives),
+        "total_seconds": round(time.perf_counter() - run_start, 6),
+        "stages": stages,
+    }
+
+
+def run_benchmarks(
+    instructor_counts=None, student_counts=None, course_types=None, quiet=True
+):
+    """
+    Sweep the pipeline over instructor count, student count and course type.
+    Table calls are counted against the in-memory backend, never the live tables.
+
+    Args:
+        instructor_counts (list): Defaults to INSTRUCTOR_COUNTS
+        student_counts (list): Defaults to STUDENT_COUNTS
+        course_types (list): Defaults to both course types
+        quiet (bool): Discard the pipeline's own print output while timing
+
+    Returns:
+        dict: Environment details and one entry per run
+    """
+    instructor_counts = instructor_counts or INSTRUCTOR_COUNTS
+    student_counts = student_counts or STUDENT_COUNTS
+    course_types = course_types or list(COURSE_TYPES)
+
+    runs = []
+    tracemalloc.start()
+    try:
+        for course_type in course_types:
+            for num_instructors in instructor_counts:
+                for num_students in student_counts:
+                    if quiet:
+                        with redirect_stdout(io.StringIO()):
+                            run = run_pipeline(num_instructors, num_students, course_type)
+                    else:
+                        run = run_pipeline(num_instructors, num_students, course_type)
+                    runs.append(run)
+                    print(
+                        f"{course_type:<10} instructors={num_instructors:<4} "
+                        f"students={num_students:<3} {run['total_seconds']:.3f}s"
+                    )
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "note": "Timings include tracemalloc overhead; compare runs made the same way.",
+        "runs": runs,
+    }
+
+
+def _run_key(run):
+    return (run["course_type"], run["instructors"], run["students"])
+
+
+def compare_benchmarks(baseline, current, threshold=1.2):
+    """
+    Compare two benchmark results (as returned by run_benchmarks).
+
+    Args:
+        baseline (dict): Earlier results
+        current (dict): New results
+        threshold (float): Time ratio at or above which a stage is flagged
+
+    Returns:
+        list: One dict per stage present in both, with time and table-call ratios
+    """
+    baseline_runs = {_run_key(run): run for run in baseline["runs"]}
+    comparison = []
+    for run in current["runs"]:
+        old_run = baseline_runs.get(_run_key(run))
+        if not old_run:
+            continue
+        for stage, new in run["stages"].items():
+            old = old_run["stages"].get(stage)
+            if not old:
+                continue
+            time_ratio = new["seconds"] / old["seconds"] if old["seconds"] else None
+            comparison.append({
+                "course_type": run["course_type"],
+                "instructors": run["instructors"],
+                "students": run["students"],
+                "stage": stage,
+                "old_seconds": old["seconds"],
+                "new_seconds": new["seconds"],
+                "time_ratio": round(time_ratio, 3) if time_ratio else None,
+                "old_table_calls": old["table_calls"],
+                "new_table_calls": new["table_calls"],
+                "regression": bool(time_ratio and time_ratio >= threshold)
+                or new["table_calls"] > old["table_calls"],
+            })
+    return comparison
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the classroom build pipeline")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--instructors", type=int, nargs="*")
+    parser.add_argument("--students", type=int, nargs="*")
+    parser.add_argument("--course-types", nargs="*", choices=list(COURSE_TYPES))
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    args = parser.parse_args()
+
+    if args.compare:
+        for row in compare_benchmarks(_load(args.compare[0]), _load(args.compare[1])):
+            flag = "REGRESSION" if row["regression"] else ""
+            print(
+                f"{row['course_type']:<10} {row['instructors']:>4} {row['students']:>3} "
+                f"{row['stage']:<34} {row['old_seconds']:>9.4f}s -> {row['new_seconds']:>9.4f}s "
+                f"calls {row['old_table_calls']} -> {row['new_table_calls']} {flag}"
+            )
+    else:
+        results = run_benchmarks(args.instructors, args.students, args.course_types)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {len(results['runs'])} runs to {args.output}")
@@ -7,15 +7,34 @@ classroom Builder Module
 Handles creation and scheduling of driving school classrooms.
 """
 
-import anvil.files
-from anvil.files import data_files
 import anvil.users
 import anvil.tables as tables
 import anvil.tables.query as q
-from anvil.tables import app_tables
+from .data_access import app_tables, in_transaction
 import anvil.server
 from datetime import datetime, timedelta, date
-from .globals import (AVAILABILITY_MAPPING, COURSE_STRUCTURE_COMPRESSED,COURSE_STRUCTURE_STANDARD,LESSON_SLOTS,days_full)
+from .globals import (AVAILABILITY_MAPPING, LESSON_SLOTS, days_full)
+from . import app_config
+from .background_tasks import enqueue_task, report_progress, finish_task, TaskMetrics
+from .utilities_server import export_merged_classroom_schedule
+from .app_logging import get_logger, set_correlation_id, DEBUG_ENABLED
+from .sessions import write_classroom_sessions
+from .course_plan import compile_course_plan, CLASS_SLOT
+from .instructor_eligibility import excluded_schools
+from .vacations import vacation_index
+from .availability_bits import roster_masks, total_slots
+from .schedule_records import (
+    ClassSession,
+    DriveSession,
+    SLOT_INDEX,
+    SLOT_NAMES,
+    as_class_sessions,
+    as_drive_sessions,
+    by_day,
+    pair_letter,
+)
+
+log = get_logger(__name__)
 
 # Schools are referenced by their abbreviation found in app_tables / schools / abbreviation
 
@@ -53,14 +72,15 @@ def get_available_days(start_date, course_structure):
 
     Args:
         start_date (date): Start date of the program
+        course_structure (dict | CoursePlan): Course structure
 
     Returns:
         list: List of available dates
     ⚠️ Needs testing with regular availability and a large holiday block
     """
+    min_course_length = compile_course_plan(course_structure).min_course_length
     available_days = []
     current_date = start_date
-    # course_structure is now always a dict
     # Get holidays from the database
     holidays = [
         {"date": datetime.strptime(date_str, "%Y-%m-%d").date(), "name": name}
@@ -69,20 +89,15 @@ def get_available_days(start_date, course_structure):
     holiday_dates = {h["date"] for h in holidays}
     days_checked = 0
     max_days_to_check = 90
-    while (
-        len(available_days) < course_structure["sequence"]["MIN_COURSE_LENGTH"]
-        and days_checked < max_days_to_check
-    ):
+    while len(available_days) < min_course_length and days_checked < max_days_to_check:
         if current_date not in holiday_dates:
             available_days.append(current_date)
         current_date += timedelta(days=1)
         days_checked += 1
-    if len(available_days) < course_structure["sequence"]["MIN_COURSE_LENGTH"]:
-        days_short = course_structure["sequence"]["MIN_COURSE_LENGTH"] - len(
-            available_days
-        )
+    if len(available_days) < min_course_length:
+        days_short = min_course_length - len(available_days)
         raise ValueError(
-            f"Could not find enough available days. Need {days_short} more days to meet minimum course length of {course_structure['sequence']['MIN_COURSE_LENGTH']} days"
+            f"Could not find enough available days. Need {days_short} more days to meet minimum course length of {min_course_length} days"
         )
     return available_days
 
@@ -102,7 +117,7 @@ def get_daily_drive_slots(day, school):
     BUT!
     ⚠️ Need to do manual comparison to check exact results.
     """
-    total_slots = 0
+    day_availabilities = []
     instructors = app_tables.users.search(is_instructor=True)
 
     for instructor in instructors:
@@ -111,16 +126,12 @@ def get_daily_drive_slots(day, school):
             continue
 
         # Check school preferences
-        school_prefs = instructor_row["school_preferences"]
-        # print(school_prefs)
-        # print(f"Checking preferences for {instructor['firstName']}: {school_prefs}")
-        if school in school_prefs.get("school_preferences", {}).get("no", []):
+        if school in excluded_schools(instructor_row["school_preferences"]):
             # ✅ This is working as expected
             continue
 
         # Check vacations
-        instructor_vacations = instructor_row["vacation_days"]
-        if day in instructor_vacations:
+        if day in vacation_index(instructor_row["vacation_days"], instructor["firstName"]):
             continue
 
         # Get availability for the specific day
@@ -131,13 +142,11 @@ def get_daily_drive_slots(day, school):
         day_availability = instructor_availability.get(day_name, {})
         if not day_availability:
             continue
+        day_availabilities.append(day_availability)
 
-        # Count available drive slots
-        for slot, status in day_availability.items():
-            if status == "Yes" or status == "Drive Only":
-                total_slots += 1
-
-    return total_slots
+    # Count available drive slots across every instructor's drive mask at once
+    drive_masks, _, _ = roster_masks(day_availabilities)
+    return total_slots(drive_masks)
 
 
 @anvil.server.callable
@@ -149,7 +158,7 @@ def calculate_weekly_capacity(start_date, school, course_structure):
     Args:
         start_date (date): Start date of the program
         school (str): School abbreviation (e.g., 'HSS', 'NHS') from app_tables/schools/abbreviation
-        course_structure (dict): Course structure
+        course_structure (dict | CoursePlan): Course structure
 
     Returns:
         dict: Contains weekly capacity information
@@ -157,7 +166,8 @@ def calculate_weekly_capacity(start_date, school, course_structure):
     BUT!
     ⚠️ Need to do manual comparison to check exact results.
     """
-    available_days = get_available_days(start_date, course_structure)
+    course_plan = compile_course_plan(course_structure)
+    available_days = get_available_days(start_date, course_plan)
     weekly_days = {}
     for day in available_days:
         week_num = (day - start_date).days // 7 + 1
@@ -180,7 +190,7 @@ def calculate_weekly_capacity(start_date, school, course_structure):
     avg_weekly_slots = sum(weekly_slots.values()) / len(weekly_slots)
     max_students = min(
         max_weekly_slots * STUDENTS_PER_DRIVE,
-        course_structure["class_sessions"]["max_students"],
+        course_plan.max_students,
     )
     weekly_slots_serialized = {str(k): v for k, v in weekly_slots.items()}
     return {
@@ -191,6 +201,39 @@ def calculate_weekly_capacity(start_date, school, course_structure):
     }
 
 
+@in_transaction
+def allocate_classroom_sequence(school, year):
+    """
+    Atomically take the next classroom sequence number for a school and year.
+    The counter lives on the school's row (next_in_sequence / sequence_year), so
+    this is one read and one write, and concurrent builds can't get the same number.
+
+    Args:
+        school (str): School abbreviation
+        year (int): Year the classroom starts in
+
+    Returns:
+        int: Sequence number, starting from 1 each year
+    """
+    school_row = app_tables.schools.get(abbreviation=school)
+    if school_row is None:
+        raise ValueError(f"School {school} not found")
+
+    if school_row["sequence_year"] == year and school_row["next_in_sequence"]:
+        sequence = school_row["next_in_sequence"]
+    else:
+        # New year, or a counter that was never initialised: carry on from any
+        # classrooms already created for this year so names stay unique
+        year_classrooms = app_tables.classrooms.search(
+            school=school,
+            start_date=q.between(date(year, 1, 1), date(year, 12, 31), max_inclusive=True),
+        )
+        sequence = max((c["sequence"] or 0 for c in year_classrooms), default=0) + 1
+
+    school_row.update(next_in_sequence=sequence + 1, sequence_year=year)
+    return sequence
+
+
 @anvil.server.callable
 def generate_classroom_name(school, start_date):
     """
@@ -200,9 +243,7 @@ def generate_classroom_name(school, start_date):
     ✅ This has been tested and works as designed
     """
     year = start_date.year
-    # Get next sequence number for this year
-    existing_classrooms = app_tables.classrooms.search(school=school)
-    sequence = len(existing_classrooms) + 1
+    sequence = allocate_classroom_sequence(school, year)
     full_name = f"{year}-{sequence:02d}-{school}"
 
     # Calculate end date (6 weeks from start)
@@ -241,43 +282,27 @@ def create_ghost_students(classroom_name, num_students):
     return students
 
 
-@anvil.server.callable
-def schedule_classes(classroom_name, start_date, num_students, course_structure):
+def build_class_sessions(classroom_name, start_date, course_structure):
     """
-    Schedule classes for the classroom.
+    Place the course's classes on their class days.
     Classes must be on specific days of the week as defined in class_days.
-    Returns a simplified object format suitable for table storage.
+
+    Returns:
+        list: ClassSession records
     """
-    print("Started scheduling classes")
-    available_days = get_available_days(start_date, course_structure)
-    min_course_length = course_structure["sequence"]["MIN_COURSE_LENGTH"]
-    weeks_needed = min_course_length // 7  # Integer division to get whole weeks
+    log.debug("Started scheduling classes for %s", classroom_name)
+    course_plan = compile_course_plan(course_structure)
+    available_days = get_available_days(start_date, course_plan)
 
-    class_schedule = []
+    class_sessions = []
     current_week = 1
     current_class = 1
-    class_days = course_structure["class_sessions"]["class_days"] # example "class_days": ["Tuesday", "Thursday"],
-    class_days = [["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"].index(d) for d in class_days]
-    classes_per_week = course_structure["class_sessions"]["classes_per_week"]
-
-    # Create a dynamic class_day_map
-    class_day_map = {}
-    class_number = 1
-
-    # For each week
-    print("bulding class day map")
-    for week in range(1, weeks_needed +1):  # Assuming 5 weeks of classes
-        # For each class in the week
-        for i in range(classes_per_week):
-            # Get the day index (0-6) for this class
-            day_index = class_days[
-                i
-            ]  # This assumes class_days is a list of day indices
-            class_day_map[class_number] = day_index
-            class_number += 1
-    print("adding classes") 
-    #error An error occurred: unsupported operand type(s) for +: 'int' and 'str'
-    while current_class <= 15:
+    # Class number -> weekday index, precomputed by the course plan
+    class_day_map = course_plan.class_day_map
+    classes_per_week = course_plan.classes_per_week
+
+    log.debug("Adding classes")
+    while current_class <= course_plan.total_classes:
         required_day = class_day_map[current_class]
         week_offset = (current_week - 1) * 7
         target_date = start_date + timedelta(days=week_offset + required_day)
@@ -287,307 +312,275 @@ def schedule_classes(classroom_name, start_date, num_students, course_structure)
                 class_date = day
                 break
         if class_date is None:
-            print(f"Warning: Could not find available date for Class {current_class}")
+            log.warning(
+                "Could not find available date for Class %s",
+                current_class,
+                classroom=classroom_name,
+            )
             break
-        class_slot = {
-          "classroom": classroom_name,  # Optional for full consistency
-          "class_number": current_class,
-          "date": class_date.isoformat(),
-          "week": current_week,
-          "day": class_date.strftime("%A"),
-          "status": "scheduled",
-          "slot": "lesson_slot_5"  
-        }
-        class_schedule.append(class_slot)
+        class_sessions.append(
+            ClassSession(current_class, class_date.toordinal(), current_week, SLOT_INDEX[CLASS_SLOT])
+        )
         current_class += 1
 
         if current_class % classes_per_week == 1:
             current_week += 1
 
-    # Print orientation details
-    print(f"\nOrientation: {start_date.strftime('%A, %Y-%m-%d')}")
+    if DEBUG_ENABLED:
+        # Orientation, first few classes and week transitions to verify scheduling
+        log.debug("Orientation: %s", start_date.strftime("%A, %Y-%m-%d"))
+        for session in class_sessions[1:4]:  # Skip orientation (index 0)
+            log.debug("Class %s: %s", session.class_number, date.fromordinal(session.day))
+        current_week = 1
+        for session in class_sessions:
+            if session.week != current_week:
+                log.debug("Week %s -> %s", current_week, session.week)
+                current_week = session.week
 
-    # Print first few classes to verify scheduling
-    print("\nFirst 3 classes:")
-    for slot in class_schedule[1:4]:  # Skip orientation (index 0)
-        print(f"Class {slot['class_number']}: {slot['date']} ({slot['day']})")
+    return class_sessions
 
-    # Print week transitions
-    print("\nWeek transitions:")
-    current_week = 1
-    for slot in class_schedule:
-        if slot["week"] != current_week:
-            print(f"Week {current_week} -> {slot['week']}")
-            current_week = slot["week"]
-          
+
+def occupied_class_slots(class_sessions):
+    """Date string -> slot names taken by classes, as passed to schedule_drives."""
     occupied_slots = {}
-    for class_slot in class_schedule:
-      date_str = class_slot["date"]
-      slot_name = class_slot["slot"]  # This is the new field we added
-      if date_str not in occupied_slots:
-        occupied_slots[date_str] = []
-        occupied_slots[date_str].append(slot_name)
+    for session in class_sessions:
+        date_str = date.fromordinal(session.day).isoformat()
+        slots = occupied_slots.setdefault(date_str, [])
+        if SLOT_NAMES[session.slot] not in slots:
+            slots.append(SLOT_NAMES[session.slot])
+    return occupied_slots
+
 
-    return class_schedule, occupied_slots
+@anvil.server.callable
+def schedule_classes(classroom_name, start_date, num_students, course_structure):
+    """
+    Schedule classes for the classroom.
+    Classes must be on specific days of the week as defined in class_days.
+    Returns a simplified object format suitable for table storage.
+    """
+    class_sessions = build_class_sessions(classroom_name, start_date, course_structure)
+    class_schedule = [session.to_dict(classroom_name) for session in class_sessions]
+    return class_schedule, occupied_class_slots(class_sessions)
 
 
 def get_weekly_lesson_slots(week_number, course_structure):
-    weekly_slots = {
-        "Monday": [],
-        "Tuesday": [],
-        "Wednesday": [],
-        "Thursday": [],
-        "Friday": [],
-        "Saturday": [],
-        "Sunday": [],
-    }
-    class_days = course_structure["class_sessions"]["class_days"]
-    class_slot = "lesson_slot_5"
-    for slot_name, slot_info in LESSON_SLOTS.items():
-        if not slot_name.startswith("break_"):
-            term_days = [day.strip() for day in slot_info["term"].split(",")]
-            if term_days == ["all"]:
-                for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]:
-                    if (
-                        week_number < 6
-                        and day in class_days
-                        and slot_name == class_slot
-                    ):
-                        continue
-                    weekly_slots[day].append(slot_name)
-                if slot_name in ["lesson_slot_4", "lesson_slot_5"]:
-                    weekly_slots["Saturday"].append(slot_name)
-                    weekly_slots["Sunday"].append(slot_name)
-            elif term_days == ["Sat", "Sun"]:
-                weekly_slots["Saturday"].append(slot_name)
-                weekly_slots["Sunday"].append(slot_name)
-    return weekly_slots
+    """Drive slots offered each day of a course week (day name -> slot names)."""
+    return compile_course_plan(course_structure).weekly_slots(week_number)
 
 
-@anvil.server.callable
-def schedule_drives(classroom_name, start_date, num_students, course_structure, occupied_slots):
+def build_drive_sessions(classroom_name, start_date, num_students, course_structure, occupied_slots):
     """
     Schedule drives (1 per week for weeks 2-6)
     First creates a master schedule that repeats each week, then adjusts for vacation days
+
+    Returns:
+        list: DriveSession records
     """
-    print("Started scheduling drives")
-    available_days = get_available_days(start_date, course_structure)
+    log.debug("Started scheduling drives for %s", classroom_name)
+    course_plan = compile_course_plan(course_structure)
+    available_days = get_available_days(start_date, course_plan)
     num_pairs = num_students // 2
     drives = []
-    vacation_days = [
-        datetime.strptime(date_str, "%Y-%m-%d").date()
+    # (date ordinal, slot index) of every drive placed so far
+    booked = set()
+    vacation_days = {
+        datetime.strptime(date_str, "%Y-%m-%d").date().toordinal()
         for date_str in no_class_days.keys()
-    ]
+    }
     spare_slots = {
-        "Sunday": "lesson_slot_1",
         "Sunday": "lesson_slot_5",
     }
     master_schedule = []
-    used_slots = {
-      "Monday": [],
-      "Tuesday": [],
-      "Wednesday": [],
-      "Thursday": [],
-      "Friday": [],
-      "Saturday": [],
-      "Sunday": [],
-    }
-  
+    used_slots = {day: set() for day in days_full}
+
     # Populate used_slots with already occupied class slots
     for date_str, slots in occupied_slots.items():
-      # Convert the date string to a date object and get the day of week
-      date_obj = datetime.fromisoformat(date_str).date()
-      day_of_week = date_obj.strftime("%A")
+        day_of_week = date.fromisoformat(date_str).strftime("%A")
+        used_slots[day_of_week].update(slots)
 
-    # Add the occupied slots to the used_slots for that day
-    for slot in slots:
-      if slot not in used_slots[day_of_week]:
-        used_slots[day_of_week].append(slot)
-
-    weekly_slots = get_weekly_lesson_slots(2, course_structure)
+    weekly_slots = course_plan.weekly_slots(2)
     for pair in range(num_pairs):
-        pair_letter = chr(65 + pair)
         scheduled = False
-        for day in [
-            "Monday",
-            "Tuesday",
-            "Wednesday",
-            "Thursday",
-            "Friday",
-            "Saturday",
-            "Sunday",
-        ]:
+        for day in days_full:
             if scheduled:
                 break
             for slot in weekly_slots[day]:
                 if slot not in used_slots[day]:
-                    master_schedule.append(
-                        {"pair_letter": pair_letter, "day": day, "slot": slot}
-                    )
-                    used_slots[day].append(slot)
+                    master_schedule.append((pair, day, slot))
+                    used_slots[day].add(slot)
                     scheduled = True
                     break
+
+    def add_drive(pair, drive_numbers, day, slot, week, is_backup_slot, rescheduled_from=None):
+        drives.append(
+            DriveSession(
+                pair,
+                drive_numbers,
+                day,
+                SLOT_INDEX[slot],
+                week,
+                is_backup_slot,
+                rescheduled_from=rescheduled_from,
+            )
+        )
+        booked.add((day, SLOT_INDEX[slot]))
+
     for week in range(5):
         week_num = week + 2
         week_start = start_date + timedelta(days=7 * (week + 1))
-        week_days = [
-            day
-            for day in available_days
-            if week_start <= day < week_start + timedelta(days=7)
-        ]
+        # Day name -> date ordinal for the available days of this week
+        week_days = {}
+        for day in available_days:
+            if week_start <= day < week_start + timedelta(days=7):
+                week_days.setdefault(day.strftime("%A"), day.toordinal())
         drives_to_reschedule = []
-        drive_numbers = course_structure["driving_sessions"]["pairs"][week_num - 2]
-        for master_drive in master_schedule:
-            pair_letter = master_drive["pair_letter"]
-            master_day = master_drive["day"]
-            master_slot = master_drive["slot"]
-            target_date = None
-            for day in week_days:
-                if day.strftime("%A") == master_day:
-                    target_date = day
-                    break
-            if target_date and target_date not in vacation_days:
-                drive_slot = {
-                    "classroom": classroom_name,
-                    "pair_letter": pair_letter,
-                    "drive_numbers": drive_numbers,
-                    "date": target_date.isoformat(),
-                    "slot": master_slot,
-                    "week": week_num,
-                    "is_backup_slot": master_day in ["Tuesday", "Thursday", "Sunday"],
-                    "is_weekend": target_date.weekday() in [5, 6],
-                    "instructor": None,
-                    "status": "scheduled",
-                }
-                drives.append(drive_slot)
+        drive_numbers = course_plan.drive_numbers(week_num)
+        for pair, master_day, master_slot in master_schedule:
+            target_day = week_days.get(master_day)
+            if target_day and target_day not in vacation_days:
+                add_drive(
+                    pair,
+                    drive_numbers,
+                    target_day,
+                    master_slot,
+                    week_num,
+                    master_day in ["Tuesday", "Thursday", "Sunday"],
+                )
             else:
-                drives_to_reschedule.append(
-                    {
-                        "pair_letter": pair_letter,
-                        "week": week_num,
-                        "original_day": master_day,
-                        "original_slot": master_slot,
-                    }
+                drives_to_reschedule.append((pair, master_day, master_slot))
+
+        for pair, original_day, original_slot in drives_to_reschedule:
+            rescheduled_from = f"{original_day} {original_slot}"
+            rescheduled = False
+            for day, slot in spare_slots.items():
+                week_day = week_days.get(day)
+                if (
+                    week_day
+                    and week_day not in vacation_days
+                    and (week_day, SLOT_INDEX[slot]) not in booked
+                ):
+                    add_drive(pair, drive_numbers, week_day, slot, week_num, True, rescheduled_from)
+                    rescheduled = True
+                    break
+            if not rescheduled:
+                for day_name, week_day in week_days.items():
+                    if rescheduled or week_day in vacation_days:
+                        continue
+                    for slot in course_plan.weekly_slots(week_num)[day_name]:
+                        if (week_day, SLOT_INDEX[slot]) not in booked:
+                            add_drive(pair, drive_numbers, week_day, slot, week_num, True, rescheduled_from)
+                            rescheduled = True
+                            break
+            if not rescheduled:
+                log.warning(
+                    "Could not reschedule Pair %s in week %s",
+                    pair_letter(pair),
+                    week_num,
+                    classroom=classroom_name,
+                    original_day=original_day,
+                    original_slot=original_slot,
                 )
-        if drives_to_reschedule:
-            for drive in drives_to_reschedule:
-                rescheduled = False
-                for day, slot in spare_slots.items():
-                    if not rescheduled:
-                        for week_day in week_days:
-                            if (
-                                week_day.strftime("%A") == day
-                                and week_day not in vacation_days
-                            ):
-                                slot_used = any(
-                                    d["date"] == week_day.isoformat()
-                                    and d["slot"] == slot
-                                    for d in drives
-                                )
-                                if not slot_used:
-                                    drive_slot = {
-                                        "classroom": classroom_name,
-                                        "pair_letter": drive["pair_letter"],
-                                        "drive_numbers": drive_numbers,
-                                        "date": week_day.isoformat(),
-                                        "slot": slot,
-                                        "week": drive["week"],
-                                        "is_backup_slot": True,
-                                        "is_weekend": week_day.weekday() in [5, 6],
-                                        "instructor": None,
-                                        "status": "scheduled",
-                                        "rescheduled_from": f"{drive['original_day']} {drive['original_slot']}",
-                                    }
-                                    drives.append(drive_slot)
-                                    rescheduled = True
-                                    break
-                if not rescheduled:
-                    for week_day in week_days:
-                        if week_day not in vacation_days and not rescheduled:
-                            available_slots = get_weekly_lesson_slots(
-                                week_num, course_structure
-                            )[week_day.strftime("%A")]
-                            for slot in available_slots:
-                                slot_used = any(
-                                    d["date"] == week_day.isoformat()
-                                    and d["slot"] == slot
-                                    for d in drives
-                                )
-                                if not slot_used:
-                                    drive_slot = {
-                                        "classroom": classroom_name,
-                                        "pair_letter": drive["pair_letter"],
-                                        "drive_numbers": drive_numbers,
-                                        "date": week_day.isoformat(),
-                                        "slot": slot,
-                                        "week": drive["week"],
-                                        "is_backup_slot": True,
-                                        "is_weekend": week_day.weekday() in [5, 6],
-                                        "instructor": None,
-                                        "status": "scheduled",
-                                        "rescheduled_from": f"{drive['original_day']} {drive['original_slot']}",
-                                    }
-                                    drives.append(drive_slot)
-                                    rescheduled = True
-                                    break
-                if not rescheduled:
-                    print(
-                        f"WARNING: Could not reschedule Pair {drive['pair_letter']} in week {drive['week']}"
-                    )
-                    print(
-                        f"Original schedule: {drive['original_day']} at {drive['original_slot']}"
-                    )
+    return drives
+
+
+@anvil.server.callable
+def schedule_drives(classroom_name, start_date, num_students, course_structure, occupied_slots):
+    """
+    Schedule drives (1 per week for weeks 2-6)
+    First creates a master schedule that repeats each week, then adjusts for vacation days
+    """
+    drive_sessions = build_drive_sessions(
+        classroom_name, start_date, num_students, course_structure, occupied_slots
+    )
+    drives = [session.to_dict(classroom_name) for session in drive_sessions]
     classroom_data_row = app_tables.classrooms.get(classroom_name=classroom_name)
     if classroom_data_row:
         classroom_data_row.update(drive_schedule=drives)
     return drives
-  
+
+
 @anvil.server.callable
-def create_full_classroom_schedule(school, start_date, task_id, num_students=None, classroom_type=None):
-  anvil.server.launch_background_task('create_full_classroom_schedule_background', school, start_date, task_id, num_students, classroom_type)
+def create_full_classroom_schedule(school, start_date, num_students=None, classroom_type=None):
+  # One build per school and start date at a time; builds for the same school
+  # share the classroom naming sequence so they never run concurrently
+  return enqueue_task(
+    'create_full_classroom_schedule_background',
+    {
+      'school': school,
+      'start_date': start_date.isoformat(),
+      'num_students': num_students,
+      'classroom_type': classroom_type,
+    },
+    idempotency_key=f"classroom_build:{school}:{start_date.isoformat()}",
+    resource_keys=[f"school:{school}"],
+  )
 
 @anvil.server.background_task
 def create_full_classroom_schedule_background(school, start_date, task_id, num_students=None, classroom_type=None):
-  print("Running background classroom builder server side")
+  set_correlation_id(task_id)
+  log.info("Building classroom for %s starting %s", school, start_date)
+  metrics = TaskMetrics()
   try:
+    if isinstance(start_date, str):
+      start_date = date.fromisoformat(start_date)
     # Select course structure ONCE
     if classroom_type == "compressed":
-      course_structure = COURSE_STRUCTURE_COMPRESSED
+      course_structure = app_config.course_structure(compressed=True)
     else:
-      course_structure = COURSE_STRUCTURE_STANDARD
+      course_structure = app_config.course_structure()
 
+    with metrics.stage("create_classroom"):
       classroom_name = generate_classroom_name(school, start_date)
-      print(f"Classroom name: {classroom_name}")
+    log.info("Classroom name: %s", classroom_name)
+    # Compiled once and shared by every stage below
+    course_plan = compile_course_plan(course_structure)
+    report_progress(task_id, 5, "Checking instructor capacity")
     if num_students is None:
-      capacity = calculate_weekly_capacity(start_date, school, course_structure)
-      num_students = min(
-        capacity["max_students"], course_structure["class_sessions"]["max_students"]
-      )
+      with metrics.stage("capacity"):
+        capacity = calculate_weekly_capacity(start_date, school, course_plan)
+      num_students = min(capacity["max_students"], course_plan.max_students)
 
-      # Creates ghost students as placeholders for actual students later
+    # Creates ghost students as placeholders for actual students later
+    with metrics.stage("ghost_students"):
       students = create_ghost_students(classroom_name, num_students)
-      print(f"Created {num_students} ghost students")
-    classes, occupied_slots = schedule_classes(
-      classroom_name, start_date, num_students, course_structure
-    )
-    if classes:
-      print("Got classes")
-    drives = schedule_drives(classroom_name, start_date, num_students, course_structure, occupied_slots)
-    if drives:
-      print("Got drives")
-    complete_schedule = anvil.server.call("create_merged_schedule", classroom_name, classes, drives)
-    if complete_schedule:
-      print("Got complete schedule")
-
-    classroom_data_row = app_tables.classrooms.get(classroom_name=classroom_name)
-    if classroom_data_row:
-      classroom_data_row.update(
-        student_list=students,
-        class_schedule=classes,
-        drive_schedule=drives,
-        status="scheduled",
-        complete_schedule=complete_schedule,
+    log.debug("Created %s ghost students", num_students)
+    report_progress(task_id, 30, "Scheduling classes")
+    with metrics.stage("classes"):
+      class_sessions = build_class_sessions(classroom_name, start_date, course_plan)
+    log.debug("Got %s classes", len(class_sessions))
+    report_progress(task_id, 45, "Scheduling drives")
+    with metrics.stage("drives"):
+      drive_sessions = build_drive_sessions(
+        classroom_name, start_date, num_students, course_plan, occupied_class_slots(class_sessions)
       )
+    log.debug("Got %s drives", len(drive_sessions))
+    report_progress(task_id, 60, "Merging schedule")
+    # Called directly rather than through anvil.server.call so the stage is
+    # measured in this process (and skips a server round trip)
+    with metrics.stage("merge"):
+      complete_schedule = create_merged_schedule(classroom_name, class_sessions, drive_sessions)
+    log.debug("Got complete schedule of %s days", len(complete_schedule))
+
+    with metrics.stage("save_classroom"):
+      # Records are only converted to their stored form here
+      classes = [session.to_dict(classroom_name) for session in class_sessions]
+      drives = [session.to_dict(classroom_name) for session in drive_sessions]
+      classroom_data_row = app_tables.classrooms.get(classroom_name=classroom_name)
+      if classroom_data_row:
+        classroom_data_row.update(
+          student_list=students,
+          class_schedule=classes,
+          drive_schedule=drives,
+          status="scheduled",
+          complete_schedule=complete_schedule,
+        )
+    with metrics.stage("sessions"):
+      if classroom_data_row:
+        write_classroom_sessions(classroom_data_row, complete_schedule)
+    metrics.record_payload("class_schedule", classes)
+    metrics.record_payload("drive_schedule", drives)
+    metrics.record_payload("complete_schedule", complete_schedule)
+    if classroom_data_row:
 
       results_message = f"""Classroom created successfully:\n
 Name: {classroom_name}\n
@@ -596,30 +589,18 @@ Max number of students: {num_students}\n
 Start date: {start_date}\n
 """
 
-    print("Exporting full schedule")
-    filename, download_message = anvil.server.call('export_merged_classroom_schedule', classroom_name, 'lessons')
+    report_progress(task_id, 75, "Exporting schedule")
+    log.debug("Exporting full schedule")
+    with metrics.stage("export"):
+      filename, download_message = export_merged_classroom_schedule(classroom_name, 'lessons')
     results_message += f"Export results: {download_message}"
 
-    task_row = app_tables.background_tasks_table.get(task_id=task_id)
-    now = datetime.now()
-    if task_row:
-      task_row.update(
-        status='complete',
-        results_text=results_message,
-        end_time=now,
-        output_filename=filename
-      )
+    finish_task(task_id, 'complete', results_message, output_filename=filename, metrics=metrics)
 
   except Exception as e:
-    task_row = app_tables.background_tasks_table.get(task_id=task_id)
-    now = datetime.now()
     error_message = f"An error occurred: {e}"
-    if task_row:
-      task_row.update(
-        status='error',
-        results_text=error_message,
-        end_time=now
-      )
+    log.error("Classroom build failed: %s", e, school=school)
+    finish_task(task_id, 'error', error_message, metrics=metrics)
 
 
 @anvil.server.callable
@@ -643,6 +624,8 @@ def test_capacity_calculation(start_date=None, school=None):
     if school is None:
         school = "HSS"  # Default to HSS for testing
 
+    course_structure = app_config.course_structure()
+
     print("\n=== Testing classroom Builder Functions ===")
     print(f"Start Date: {start_date}")
     print(f"School: {school}")
@@ -663,7 +646,7 @@ def test_capacity_calculation(start_date=None, school=None):
 
     # Test calculate_weekly_capacity
     print("\n3. Testing calculate_weekly_capacity...")
-    capacity = calculate_weekly_capacity(start_date, school, COURSE_STRUCTURE_STANDARD)
+    capacity = calculate_weekly_capacity(start_date, school, course_structure)
     print(f"Weekly slots: {capacity['weekly_slots']}")
     print(f"Max weekly slots: {capacity['max_weekly_slots']}")
     print(f"Maximum students: {capacity['max_students']}")
@@ -675,8 +658,8 @@ def test_capacity_calculation(start_date=None, school=None):
 
     # Test class scheduling
     print("\n5. Testing class scheduling...")
-    classes = schedule_classes(
-        classroom_name, start_date, capacity["max_students"], COURSE_STRUCTURE_STANDARD
+    classes, occupied_slots = schedule_classes(
+        classroom_name, start_date, capacity["max_students"], course_structure
     )
     print(f"Scheduled {len(classes)} classes")
     print("First week classes:")
@@ -686,7 +669,7 @@ def test_capacity_calculation(start_date=None, school=None):
     # Test drive scheduling
     print("\n6. Testing drive scheduling...")
     drives = schedule_drives(
-        classroom_name, start_date, capacity["max_students"], COURSE_STRUCTURE_STANDARD
+        classroom_name, start_date, capacity["max_students"], course_structure, occupied_slots
     )
     print(f"Scheduled {len(drives)} drives")
 
@@ -735,6 +718,8 @@ def create_merged_schedule(classroom_name, classes, drives):
 
     Args:
         classroom_name (str): Name of the classroom
+        classes (list): ClassSession records or stored class dicts
+        drives (list): DriveSession records or stored drive dicts
 
     Returns:
         list: List of daily schedules with slot assignments
@@ -744,15 +729,11 @@ def create_merged_schedule(classroom_name, classes, drives):
     if not classroom:
         raise ValueError(f"classroom {classroom_name} not found")
 
-    # Get class and drive schedules
-    #class_schedule = classroom['class_schedule'] or []
-    class_schedule = classes
-    print(class_schedule)
-    drive_schedule = drives
-    print(drive_schedule)
-    #print(f"\nDebug - Class Schedule:\n{class_schedule}")
-    #drive_schedule = classroom["drive_schedule"] or []
-
+    # Index sessions by day so each day only looks at its own sessions
+    classes_by_day = by_day(as_class_sessions(classes))
+    drives_by_day = by_day(as_drive_sessions(drives))
+    if DEBUG_ENABLED:
+        log.debug("Classes on %s days, drives on %s days", len(classes_by_day), len(drives_by_day))
 
     # Create a dictionary of all dates in the classroom's date range
     start_date = classroom["start_date"]
@@ -762,7 +743,7 @@ def create_merged_schedule(classroom_name, classes, drives):
 
     while current_date <= end_date:
         date_str = current_date.strftime("%Y-%m-%d")
- 
+        day_ordinal = current_date.toordinal()
 
         # Create daily schedule
         day_schedule = {
@@ -774,61 +755,56 @@ def create_merged_schedule(classroom_name, classes, drives):
         }
 
         # Initialize all slots
-        for slot_name in LESSON_SLOTS:
-            if not slot_name.startswith("break_"):
-                if day_schedule["is_vacation"]:
-                    # Mark all slots as vacation for vacation days
-                    day_schedule["slots"][slot_name] = {
-                        "type": "vacation",
-                        "title": "Vacation",
-                        "details": {
-                            "holiday_name": no_class_days.get(date_str, "Vacation Day")
-                        },
-                    }
-                else:
-                    # Initialize as empty for non-vacation days
-                    day_schedule["slots"][slot_name] = {
-                        "type": None,
-                        "title": None,
-                        "details": None,
-                    }
+        for slot_name in SLOT_NAMES:
+            if day_schedule["is_vacation"]:
+                # Mark all slots as vacation for vacation days
+                day_schedule["slots"][slot_name] = {
+                    "type": "vacation",
+                    "title": "Vacation",
+                    "details": {
+                        "holiday_name": no_class_days.get(date_str, "Vacation Day")
+                    },
+                }
+            else:
+                # Initialize as empty for non-vacation days
+                day_schedule["slots"][slot_name] = {
+                    "type": None,
+                    "title": None,
+                    "details": None,
+                }
 
         # Add class assignments (only for non-vacation days)
-        # Add class assignments (only for non-vacation days)
-        if not day_schedule["is_vacation"]:
-          for class_slot in class_schedule:
-            # Simple direct string comparison
-            if class_slot["date"] == date_str:
-              # Use the slot from class_slot
-              slot_to_use = class_slot["slot"]
-              day_schedule["slots"][slot_to_use] = {
-                "type": "class",
-                "title": f"Class {class_slot['class_number']}",
-                "details": {
-                  "week": class_slot["week"],
-                  "status": class_slot["status"],
-                },
-              }
-              print(f"Added class {class_slot['class_number']} to {date_str} in slot {slot_to_use}")
-        
-        # Add drive assignments after classes (only for non-vacation days)
         if not day_schedule["is_vacation"]:
-          for drive_slot in drive_schedule:
-            if drive_slot["date"] == date_str:
-              slot_to_use = drive_slot["slot"]
-              # Only add the drive if the slot isn't already used by a class
-              if day_schedule["slots"][slot_to_use]["type"] != "class":
+            for session in classes_by_day.get(day_ordinal, ()):
+                slot_to_use = SLOT_NAMES[session.slot]
                 day_schedule["slots"][slot_to_use] = {
-                  "type": "drive",
-                  "title": f"Pair {drive_slot['pair_letter']}: Drives {drive_slot['drive_numbers']}",
-                  "details": {
-                    "week": drive_slot["week"],
-                    "is_backup_slot": drive_slot["is_backup_slot"],
-                    "is_weekend": drive_slot["is_weekend"],
-                    "status": drive_slot["status"],
-                  },
+                    "type": "class",
+                    "title": f"Class {session.class_number}",
+                    "details": {
+                        "week": session.week,
+                        "status": session.status,
+                        "class_number": session.class_number,
+                    },
                 }
-                print(f"Added drive for pair {drive_slot['pair_letter']} to {date_str} in slot {slot_to_use}")
+                log.debug("Added class %s to %s in slot %s", session.class_number, date_str, slot_to_use)
+
+            # Add drive assignments after classes
+            for session in drives_by_day.get(day_ordinal, ()):
+                slot_to_use = SLOT_NAMES[session.slot]
+                # Only add the drive if the slot isn't already used by a class
+                if day_schedule["slots"][slot_to_use]["type"] != "class":
+                    day_schedule["slots"][slot_to_use] = {
+                        "type": "drive",
+                        "title": f"Pair {session.pair_letter}: Drives {session.drive_numbers}",
+                        "details": {
+                            "week": session.week,
+                            "is_backup_slot": session.is_backup_slot,
+                            "is_weekend": session.is_weekend,
+                            "status": session.status,
+                            "pair_letter": session.pair_letter,
+                        },
+                    }
+                    log.debug("Added drive for pair %s to %s in slot %s", session.pair_letter, date_str, slot_to_use)
 
         daily_schedules.append(day_schedule)
         current_date += timedelta(days=1)
@@ -0,0 +1,112 @@
+"""
+Conflicts Module
+
+Detects instructors booked into the same date and slot more than once, across
+all classrooms. The instructor scheduler only marks slots as Scheduled in the
+availability it loaded, so two classrooms scheduled from stale snapshots can
+double-book an instructor; this is the check that catches it.
+
+Both checks build an (instructor, date, slot) hash index, so they run in time
+linear in the number of sessions:
+- check_classroom_conflicts: incremental, run after each scheduling task on the
+  sessions that overlap the classroom just scheduled.
+- audit_instructor_conflicts: full audit over every classroom's
+  complete_schedule_with_instructors, on demand.
+"""
+
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables
+from .app_logging import get_logger
+
+log = get_logger(__name__)
+
+
+def _collisions(bookings):
+    """
+    Group bookings by (instructor, date, slot) and return those booked more than once.
+
+    Args:
+        bookings (iterable): (instructor_name, date_str, slot, classroom_name, title) tuples
+
+    Returns:
+        list: One dict per collision with the instructor, date, slot and clashing sessions
+    """
+    index = {}
+    for instructor_name, date_str, slot, classroom_name, title in bookings:
+        if not instructor_name:
+            continue
+        index.setdefault((instructor_name, date_str, slot), []).append(
+            {"classroom_name": classroom_name, "title": title}
+        )
+    return [
+        {"instructor": instructor_name, "date": date_str, "slot": slot, "sessions": sessions}
+        for (instructor_name, date_str, slot), sessions in index.items()
+        if len(sessions) > 1
+    ]
+
+
+def _schedule_bookings(classroom_name, daily_schedules):
+    for day in daily_schedules or []:
+        for slot, slot_data in day["slots"].items():
+            if slot_data.get("instructor"):
+                yield (slot_data["instructor"], day["date"], slot, classroom_name, slot_data["title"])
+
+
+def check_classroom_conflicts(classroom_row, instructor_names):
+    """
+    Check the classroom's instructors for double bookings within its date range.
+    Only reads the sessions of those instructors on those dates.
+
+    Args:
+        classroom_row (Row): Row from classrooms that has just been scheduled
+        instructor_names (list): firstNames of the instructors assigned to it
+
+    Returns:
+        list: Collisions involving this classroom
+    """
+    if not instructor_names:
+        return []
+    sessions = app_tables.sessions.search(
+        instructor_name=q.any_of(*instructor_names),
+        date=q.between(classroom_row["start_date"], classroom_row["end_date"], max_inclusive=True),
+    )
+    bookings = (
+        (s["instructor_name"], s["date"].isoformat(), s["slot"], s["classroom_name"], s["title"])
+        for s in sessions
+    )
+    classroom_name = classroom_row["classroom_name"]
+    collisions = [
+        collision
+        for collision in _collisions(bookings)
+        if any(s["classroom_name"] == classroom_name for s in collision["sessions"])
+    ]
+    if collisions:
+        log.warning(
+            "%s double bookings found after scheduling %s",
+            len(collisions),
+            classroom_name,
+            collisions=collisions[:5],
+        )
+    return collisions
+
+
+@anvil.server.callable(require_user=lambda user: user["is_admin"])
+def audit_instructor_conflicts():
+    """
+    Full audit: every double booking across all classrooms' instructor schedules.
+
+    Returns:
+        list: Collisions sorted by date and slot
+    """
+    bookings = (
+        booking
+        for classroom_row in app_tables.classrooms.search()
+        for booking in _schedule_bookings(
+            classroom_row["classroom_name"], classroom_row["complete_schedule_with_instructors"]
+        )
+    )
+    collisions = sorted(_collisions(bookings), key=lambda c: (c["date"], c["slot"]))
+    log.info("Conflict audit found %s double bookings", len(collisions))
+    return collisions
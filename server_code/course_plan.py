@@ -0,0 +1,134 @@
+"""
+Course Plan Module
+
+Compiles a course structure (COURSE_STRUCTURE_STANDARD / COURSE_STRUCTURE_COMPRESSED)
+into a CoursePlan once, so the scheduling stages read precomputed values instead
+of re-reading the raw dicts and the lesson slot "term" days on every call.
+
+Plans are memoized by a hash of the structure and lesson slots, so compiling the
+same structure again is a dictionary lookup.
+"""
+
+import hashlib
+import json
+from .globals import days_full
+from .app_config import lesson_slots as configured_lesson_slots
+
+# Class slot kept free of drives on class days during the class weeks
+CLASS_SLOT = "lesson_slot_5"
+# Weeks before this one still have classes running
+FIRST_WEEK_WITHOUT_CLASSES = 6
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+WEEKEND_TERM_SLOTS = ["lesson_slot_4", "lesson_slot_5"]
+
+_compiled_plans = {}
+
+
+class CoursePlan:
+    """
+    Precomputed view of a course structure.
+
+    Attributes:
+        structure (dict): The raw course structure it was compiled from
+        min_course_length (int): Minimum days the classroom runs
+        weeks_needed (int): Whole weeks in the minimum course length
+        total_classes (int): Number of class sessions
+        classes_per_week (int): Class sessions per week
+        class_days (tuple): Class day names, e.g. ("Tuesday", "Thursday")
+        class_weekdays (tuple): Class days as weekday indices (Monday = 0)
+        class_day_map (dict): Class number -> weekday index it falls on
+        drive_pairs (tuple): Drive numbers for each drive week, starting with week 2
+        max_students (int): Most students in a class
+    """
+
+    __slots__ = (
+        "structure",
+        "min_course_length",
+        "weeks_needed",
+        "total_classes",
+        "classes_per_week",
+        "class_days",
+        "class_weekdays",
+        "class_day_map",
+        "drive_pairs",
+        "max_students",
+        "_class_week_slots",
+        "_open_week_slots",
+    )
+
+    def __init__(self, structure, lesson_slots):
+        class_sessions = structure["class_sessions"]
+        self.structure = structure
+        self.min_course_length = structure["sequence"]["MIN_COURSE_LENGTH"]
+        self.weeks_needed = self.min_course_length // 7
+        self.total_classes = class_sessions["total_sessions"]
+        self.classes_per_week = class_sessions["classes_per_week"]
+        self.class_days = tuple(class_sessions["class_days"])
+        self.class_weekdays = tuple(days_full.index(day) for day in self.class_days)
+        self.drive_pairs = tuple(structure["driving_sessions"]["pairs"])
+        self.max_students = class_sessions["max_students"]
+
+        self.class_day_map = {}
+        class_number = 1
+        for week in range(1, self.weeks_needed + 1):
+            for i in range(self.classes_per_week):
+                self.class_day_map[class_number] = self.class_weekdays[i]
+                class_number += 1
+
+        self._class_week_slots = self._slot_template(lesson_slots, class_weeks=True)
+        self._open_week_slots = self._slot_template(lesson_slots, class_weeks=False)
+
+    def _slot_template(self, lesson_slots, class_weeks):
+        weekly_slots = {day: [] for day in days_full}
+        for slot_name, slot_info in lesson_slots.items():
+            if slot_name.startswith("break_"):
+                continue
+            term_days = slot_info["term"]
+            if set(term_days) == set(days_full):
+                # Full-week slots run every weekday, but weekends only when listed
+                term_days = list(WEEKDAYS)
+                if slot_name in WEEKEND_TERM_SLOTS:
+                    term_days += ["Saturday", "Sunday"]
+            for day in term_days:
+                if class_weeks and day in self.class_days and slot_name == CLASS_SLOT:
+                    continue
+                weekly_slots[day].append(slot_name)
+        # Shared between callers, so hand out tuples rather than lists
+        return {day: tuple(slots) for day, slots in weekly_slots.items()}
+
+    def weekly_slots(self, week_number):
+        """Drive slots offered each day of the given course week (day name -> slot names)."""
+        if week_number < FIRST_WEEK_WITHOUT_CLASSES:
+            return self._class_week_slots
+        return self._open_week_slots
+
+    def drive_numbers(self, week_number):
+        """Drive numbers taken in the given course week (drives start in week 2)."""
+        return self.drive_pairs[week_number - 2]
+
+
+def _structure_hash(structure, lesson_slots):
+    payload = json.dumps([structure, lesson_slots], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def compile_course_plan(course_structure, lesson_slots=None):
+    """
+    Compile (or fetch the memoized) CoursePlan for a course structure.
+    Passing a CoursePlan returns it unchanged, so scheduling functions can
+    accept either form.
+
+    Args:
+        course_structure (dict | CoursePlan): Course structure to compile
+        lesson_slots (dict): Lesson slot definitions (defaults to the configured lesson slots)
+
+    Returns:
+        CoursePlan
+    """
+    if isinstance(course_structure, CoursePlan):
+        return course_structure
+    lesson_slots = lesson_slots or configured_lesson_slots()
+    key = _structure_hash(course_structure, lesson_slots)
+    if key not in _compiled_plans:
+        _compiled_plans[key] = CoursePlan(course_structure, lesson_slots)
+    return _compiled_plans[key]
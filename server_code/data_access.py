@@ -0,0 +1,518 @@
+"""
+Data Access Module
+
+Server modules reach the data tables through `app_tables` from this module
+rather than importing it from anvil.tables directly. This gives us:
+
+- A pluggable backend: the live Anvil tables by default, or an in-memory
+  stand-in seeded from the repo's example JSON files for offline timing.
+- Per-operation call counts (get / search / add_row / update / delete by table),
+  so the cost of a hot path can be measured with count_table_calls().
+
+Rows are only wrapped (as CountedRow, so their updates and deletes count too)
+while a count_table_calls() block is active. Outside one, searches and gets
+return the backend's own rows, which can be returned to the client or stored in
+link columns as usual. Counted rows passed back into a table call are unwrapped
+here, so rows fetched inside a counted stage stay usable after it.
+
+Usage (offline):
+    use_backend(memory_backend_from_examples())
+    with count_table_calls() as calls:
+        calculate_weekly_capacity(start_date, "HSS", COURSE_STRUCTURE_STANDARD)
+    print(calls.total, calls.by_operation())
+"""
+
+import anvil.tables as tables
+import anvil.tables.query as q
+from contextlib import contextmanager
+from datetime import date, timedelta
+import functools
+import itertools
+import json
+import os
+
+# Backend currently in use; None means the live anvil.tables app_tables
+_backend = None
+# Counters collecting calls, one per active count_table_calls() block
+_active_counters = []
+
+
+###########################################################
+# Call counting
+
+
+class TableCallCounter:
+    """Counts table operations made while a count_table_calls() block is active."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, table_name, operation):
+        key = (table_name, operation)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def by_operation(self):
+        totals = {}
+        for (_, operation), count in self.counts.items():
+            totals[operation] = totals.get(operation, 0) + count
+        return totals
+
+    def by_table(self):
+        totals = {}
+        for (table_name, _), count in self.counts.items():
+            totals[table_name] = totals.get(table_name, 0) + count
+        return totals
+
+    def as_dict(self):
+        """simpleObject-safe summary"""
+        return {
+            "total": self.total,
+            "by_operation": self.by_operation(),
+            "by_table": self.by_table(),
+        }
+
+
+@contextmanager
+def count_table_calls():
+    """Count every table operation made inside the with-block."""
+    counter = TableCallCounter()
+    _active_counters.append(counter)
+    try:
+        yield counter
+    finally:
+        _active_counters.remove(counter)
+
+
+def _count(table_name, operation):
+    for counter in _active_counters:
+        counter.add(table_name, operation)
+
+
+###########################################################
+# Counting wrappers around whichever backend is active
+
+
+def unwrap_row(value):
+    """Return the backend row behind a counted row (anything else is returned as-is)."""
+    if isinstance(value, CountedRow):
+        return value._row
+    return value
+
+
+# Query constructors that combine other values, and those that compare against one
+_COMBINING_QUERIES = (q.any_of, q.all_of, q.none_of)
+_COMPARISON_QUERIES = (
+    q.greater_than,
+    q.greater_than_or_equal_to,
+    q.less_than,
+    q.less_than_or_equal_to,
+)
+# Some anvil.tables versions build q.between from the comparison queries above,
+# others return a query object holding min / max and the inclusive flags
+_BETWEEN_QUERIES = (q.between,) if isinstance(q.between, type) else ()
+# Positional search arguments that shape the results rather than filter them
+_SEARCH_OPTIONS = (tables.order_by, q.fetch_only, q.page_size, q.only_cols)
+
+
+def _unwrap_query(value):
+    # Rows inside q.any_of(...) etc. need unwrapping too
+    if isinstance(value, _COMBINING_QUERIES) and value.args and not value.kwargs:
+        return type(value)(*[unwrap_row(arg) for arg in value.args])
+    return unwrap_row(value)
+
+
+def _unwrap_kwargs(values):
+    return {k: _unwrap_query(v) for k, v in values.items()}
+
+
+class CountedRow:
+    """Thin wrapper so row updates and deletes are counted too."""
+
+    __slots__ = ("_row", "_table_name")
+
+    def __init__(self, row, table_name):
+        self._row = row
+        self._table_name = table_name
+
+    def __getitem__(self, column):
+        return self._row[column]
+
+    def __setitem__(self, column, value):
+        _count(self._table_name, "update")
+        self._row[column] = unwrap_row(value)
+
+    def update(self, **values):
+        _count(self._table_name, "update")
+        self._row.update(**_unwrap_kwargs(values))
+
+    def delete(self):
+        _count(self._table_name, "delete")
+        self._row.delete()
+
+    def get_id(self):
+        return self._row.get_id()
+
+    def __iter__(self):
+        return iter(self._row)
+
+    def __eq__(self, other):
+        return self._row == unwrap_row(other)
+
+    def __hash__(self):
+        return hash(self._row)
+
+    def __bool__(self):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._row, name)
+
+    def __repr__(self):
+        return repr(self._row)
+
+
+class CountedSearch:
+    """Search results that wrap rows lazily as they are iterated."""
+
+    def __init__(self, results, table_name):
+        self._results = results
+        self._table_name = table_name
+
+    def __iter__(self):
+        for row in self._results:
+            yield CountedRow(row, self._table_name)
+
+    def __len__(self):
+        return len(self._results)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [CountedRow(row, self._table_name) for row in self._results[index]]
+        return CountedRow(self._results[index], self._table_name)
+
+    def delete_all_rows(self):
+        _count(self._table_name, "delete")
+        self._results.delete_all_rows()
+
+
+def _wrap(row, table_name):
+    if row is None or not _active_counters:
+        return row
+    return CountedRow(row, table_name)
+
+
+class CountedTable:
+    """
+    A table on the active backend. Calls are counted, and rows are wrapped,
+    only while a count_table_calls() block is active.
+    """
+
+    def __init__(self, table, table_name):
+        self._table = table
+        self._table_name = table_name
+
+    def get(self, *args, **kwargs):
+        _count(self._table_name, "get")
+        return _wrap(self._table.get(*args, **_unwrap_kwargs(kwargs)), self._table_name)
+
+    def get_by_id(self, row_id, *args, **kwargs):
+        _count(self._table_name, "get")
+        return _wrap(self._table.get_by_id(row_id, *args, **kwargs), self._table_name)
+
+    def search(self, *args, **kwargs):
+        _count(self._table_name, "search")
+        results = self._table.search(*args, **_unwrap_kwargs(kwargs))
+        if not _active_counters:
+            return results
+        return CountedSearch(results, self._table_name)
+
+    def add_row(self, **values):
+        _count(self._table_name, "add_row")
+        return _wrap(self._table.add_row(**_unwrap_kwargs(values)), self._table_name)
+
+    def add_rows(self, rows):
+        _count(self._table_name, "add_row")
+        rows = self._table.add_rows([_unwrap_kwargs(values) for values in rows])
+        return [_wrap(row, self._table_name) for row in rows]
+
+    def delete_all_rows(self, *args, **kwargs):
+        _count(self._table_name, "delete")
+        return self._table.delete_all_rows(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._table, name)
+
+
+class _AppTables:
+    """Drop-in for anvil.tables.app_tables that routes to the active backend."""
+
+    def __getattr__(self, table_name):
+        if _backend is None:
+            table = getattr(tables.app_tables, table_name)
+        else:
+            table = _backend[table_name]
+        return CountedTable(table, table_name)
+
+    def __getitem__(self, table_name):
+        return self.__getattr__(table_name)
+
+
+app_tables = _AppTables()
+
+
+def use_backend(backend):
+    """
+    Switch the tables backend for this process.
+    Pass a MemoryBackend for offline runs, or None to go back to the live tables.
+    """
+    global _backend
+    _backend = backend
+
+
+def in_transaction(f):
+    """
+    tables.in_transaction that is skipped for the in-memory backend,
+    which has no transactions (and no server to open one on).
+    """
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        if _backend is None:
+            return tables.in_transaction(f)(*args, **kwargs)
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+###########################################################
+# In-memory backend
+
+
+class MemoryRow:
+    _ids = itertools.count(1)
+
+    def __init__(self, table, values):
+        self._table = table
+        self._values = dict(values)
+        self._id = f"[{table.name},{next(MemoryRow._ids)}]"
+
+    def __getitem__(self, column):
+        return self._values.get(column)
+
+    def __setitem__(self, column, value):
+        self._values[column] = value
+
+    def update(self, **values):
+        self._values.update(values)
+
+    def delete(self):
+        self._table._rows.remove(self)
+
+    def get_id(self):
+        return self._id
+
+    def __iter__(self):
+        return iter(self._values.items())
+
+    def __repr__(self):
+        return f"<MemoryRow {self._table.name} {self._values}>"
+
+
+def _matches(value, condition):
+    """Evaluate a column value against a plain value or an anvil.tables.query object."""
+    if isinstance(condition, q.any_of):
+        return any(_matches(value, c) for c in condition.args)
+    if isinstance(condition, q.all_of):
+        return all(_matches(value, c) for c in condition.args)
+    if isinstance(condition, q.none_of):
+        return not any(_matches(value, c) for c in condition.args)
+    if value is None and isinstance(condition, _COMPARISON_QUERIES + _BETWEEN_QUERIES):
+        return False
+    if isinstance(condition, _BETWEEN_QUERIES):
+        above_min = value >= condition.min if condition.min_inclusive else value > condition.min
+        below_max = value <= condition.max if condition.max_inclusive else value < condition.max
+        return above_min and below_max
+    if isinstance(condition, q.greater_than_or_equal_to):
+        return value >= condition.value
+    if isinstance(condition, q.greater_than):
+        return value > condition.value
+    if isinstance(condition, q.less_than_or_equal_to):
+        return value <= condition.value
+    if isinstance(condition, q.less_than):
+        return value < condition.value
+    if type(condition).__module__ == q.__name__:
+        # like, full_text_match etc. - refuse rather than compare by equality
+        raise NotImplementedError(
+            f"Memory backend does not support {type(condition).__name__} queries"
+        )
+    return value == condition
+
+
+def _row_matches(row, args, kwargs):
+    for column, condition in kwargs.items():
+        if not _matches(row[column], condition):
+            return False
+    for query in args:
+        if isinstance(query, _COMBINING_QUERIES) and query.kwargs:
+            results = [_row_matches(row, (), {k: v}) for k, v in query.kwargs.items()]
+            if isinstance(query, q.any_of) and not any(results):
+                return False
+            if isinstance(query, q.all_of) and not all(results):
+                return False
+            if isinstance(query, q.none_of) and any(results):
+                return False
+        elif not isinstance(query, _SEARCH_OPTIONS):
+            raise NotImplementedError(
+                f"Memory backend does not support positional {type(query).__name__} queries"
+            )
+    return True
+
+
+class MemorySearch(list):
+    def delete_all_rows(self):
+        for row in self:
+            row.delete()
+
+
+class MemoryTable:
+    def __init__(self, name):
+        self.name = name
+        self._rows = []
+
+    def add_row(self, **values):
+        row = MemoryRow(self, values)
+        self._rows.append(row)
+        return row
+
+    def add_rows(self, rows):
+        return [self.add_row(**values) for values in rows]
+
+    def search(self, *args, **kwargs):
+        rows = MemorySearch(r for r in self._rows if _row_matches(r, args, kwargs))
+        # Sort by the last order_by first so the first one ends up most significant
+        for order in reversed(args):
+            if isinstance(order, tables.order_by):
+                rows.sort(
+                    key=lambda r: (r[order.column_name] is None, r[order.column_name]),
+                    reverse=not order.ascending,
+                )
+        return rows
+
+    def get(self, *args, **kwargs):
+        rows = self.search(*args, **kwargs)
+        if len(rows) > 1:
+            raise tables.TableError(f"More than one row matched this query in {self.name}")
+        return rows[0] if rows else None
+
+    def get_by_id(self, row_id, *args, **kwargs):
+        return next((r for r in self._rows if r.get_id() == row_id), None)
+
+    def delete_all_rows(self):
+        self._rows = []
+
+
+class MemoryBackend:
+    """A dict of MemoryTables that creates tables on first use."""
+
+    def __init__(self):
+        self._tables = {}
+
+    def __getitem__(self, table_name):
+        if table_name not in self._tables:
+            self._tables[table_name] = MemoryTable(table_name)
+        return self._tables[table_name]
+
+
+def _load_example(filename):
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(repo_root, filename)) as f:
+        return json.load(f)
+
+
+def memory_backend_from_examples(num_instructors=5, start_date=None):
+    """
+    Build an in-memory backend seeded from the repo's example JSON files.
+
+    Every instructor gets the weekly availability in natasha_availability_good.JSON,
+    and a classroom is created from example_classes.json and
+    complete_schedule_example.json.
+
+    Args:
+        num_instructors (int): How many synthetic instructors to create
+        start_date (date): First day of the generated seven-month availability
+
+    Returns:
+        MemoryBackend
+    """
+    # Imported here so globals isn't loaded just to use the live backend
+    from .globals import LESSON_SLOTS, AVAILABILITY_MAPPING, days_full, days_short
+
+    backend = MemoryBackend()
+    start_date = start_date or date.today()
+    weekly_availability = _load_example("natasha_availability_good.JSON")
+    class_schedule = _load_example("example_classes.json")
+    complete_schedule = _load_example("complete_schedule_example.json")
+
+    backend["global_variables_edit_with_care"].add_row(
+        version="latest",
+        lesson_slots=LESSON_SLOTS,
+        availability_mapping=AVAILABILITY_MAPPING,
+        days_full=days_full,
+        days_short=days_short,
+        current_teen_driving_schedule=LESSON_SLOTS,
+    )
+    for abbreviation in ["HSS", "NHS"]:
+        backend["schools"].add_row(
+            school_name=abbreviation,
+            abbreviation=abbreviation,
+            next_in_sequence=None,
+            sequence_year=None,
+        )
+
+    seven_month = {}
+    for offset in range(240):
+        day = start_date + timedelta(days=offset)
+        day_availability = weekly_availability["weekly_availability"].get(
+            day.strftime("%A").lower(), {}
+        )
+        seven_month[str(day)] = {
+            slot: AVAILABILITY_MAPPING.get(day_availability.get(slot, "No"), 0)
+            for slot in LESSON_SLOTS
+        }
+
+    for i in range(num_instructors):
+        instructor = backend["users"].add_row(
+            firstName=f"Instructor{i + 1:03d}",
+            surname="Example",
+            email=f"instructor{i + 1:03d}@example.com",
+            is_instructor=True,
+            instructorID=f"I{i + 1:03d}",
+            display_order=i + 1,
+            enabled=True,
+        )
+        backend["instructor_schedules"].add_row(
+            instructor=instructor,
+            weekly_availability_term=weekly_availability,
+            weekly_availability=weekly_availability,
+            school_preferences={"no": []},
+            vacation_days={"vacation_days": []},
+            current_seven_month_availability=json.loads(json.dumps(seven_month)),
+        )
+
+    first_day = date.fromisoformat(complete_schedule[0]["date"])
+    last_day = date.fromisoformat(complete_schedule[-1]["date"])
+    backend["classrooms"].add_row(
+        classroom_name=f"{first_day.year}-01-HSS",
+        school="HSS",
+        start_date=first_day,
+        end_date=last_day,
+        status="scheduled",
+        sequence=1,
+        class_schedule=class_schedule,
+        complete_schedule=complete_schedule,
+    )
+    return backend
@@ -0,0 +1,215 @@
+"""
+File Store Module
+
+Paged listing of the files table for the file_transfer form, and retention for
+the exports that accumulate in it.
+
+Listings only fetch the filename, file_type and created columns, so no media
+objects are sent to the client until a file is downloaded with get_file_media.
+Listing and downloading need a logged-in user; deleting needs an admin.
+
+Retention: prune_stored_files (scheduled daily) groups exports by kind and
+classroom from their filenames, keeps the newest keep_latest of each group and
+deletes the rest, plus anything older than max_age_days. Uploaded files are
+never pruned, nor is any file named as a background task's output_filename.
+"""
+
+import anvil.server
+import anvil.tz
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables, in_transaction
+from .app_logging import get_logger
+from datetime import datetime, timedelta
+import re
+
+log = get_logger(__name__)
+
+FILE_PAGE_SIZE = 25
+MAX_FILE_PAGE_SIZE = 100
+FILE_TYPES = ["Excel", "CSV", "User Schedule", "User Profile", "Group Schedule"]
+
+# Only files the app exported itself are pruned; uploads are kept
+EXPORT_FILE_TYPES = ("Excel", "CSV")
+# Export kind -> filename pattern; a "classroom" group keeps each classroom's files apart
+EXPORT_KINDS = (
+    ("merged_schedule_instructors", re.compile(r"^(?P<classroom>.+)_merged_schedule_lessons_instructors\.xlsx$")),
+    ("merged_schedule", re.compile(r"^(?P<classroom>.+)_merged_schedule_lessons\.xlsx$")),
+    ("classroom_schedule", re.compile(r"^(?P<classroom>.+)_schedule\.xlsx$")),
+    ("capacity_report", re.compile(r"^capacity_oveview_.*\.xlsx$")),
+    ("availability_240_days", re.compile(r"^instructor_availability_240Days_.*\.xlsx$")),
+)
+DEFAULT_RETENTION = {"keep_latest": 3, "max_age_days": 90}
+# Per export kind overrides of DEFAULT_RETENTION
+RETENTION_POLICIES = {
+    "capacity_report": {"keep_latest": 5, "max_age_days": 30},
+    "availability_240_days": {"keep_latest": 2, "max_age_days": 30},
+}
+# Files deleted per transaction
+RETENTION_BATCH_SIZE = 50
+
+
+def file_to_dict(file_row):
+    return {
+        "id": file_row.get_id(),
+        "filename": file_row["filename"],
+        "file_type": file_row["file_type"],
+        "created": file_row["created"],
+    }
+
+
+@anvil.server.callable(require_user=True)
+def list_files(page=0, page_size=FILE_PAGE_SIZE, file_type=None, newest_first=True):
+    """
+    One page of stored files, without their media.
+
+    Args:
+        page (int): Zero-based page number
+        page_size (int): Files per page, up to MAX_FILE_PAGE_SIZE
+        file_type (str): Only files of this type, e.g. "Excel"
+        newest_first (bool): Sort by created, newest first (oldest first if False)
+
+    Returns:
+        dict: files (list of id, filename, file_type, created), page, page_size and has_more
+    """
+    page_size = max(1, min(page_size, MAX_FILE_PAGE_SIZE))
+    filters = {}
+    if file_type:
+        filters["file_type"] = file_type
+
+    results = app_tables.files.search(
+        q.fetch_only("filename", "file_type", "created"),
+        tables.order_by("created", ascending=not newest_first),
+        **filters,
+    )
+    start = page * page_size
+    # One extra row tells us whether there is a next page without counting them all
+    rows = results[start : start + page_size + 1]
+    return {
+        "files": [file_to_dict(row) for row in rows[:page_size]],
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(rows) > page_size,
+    }
+
+
+def _file_row(file_id):
+    file_row = app_tables.files.get_by_id(file_id)
+    if file_row is None:
+        raise ValueError(f"File {file_id} not found")
+    return file_row
+
+
+@anvil.server.callable(require_user=True)
+def get_file_media(file_id):
+    """The stored media for a file from list_files, for download."""
+    return _file_row(file_id)["file"]
+
+
+@anvil.server.callable(require_user=lambda user: user["is_admin"])
+def delete_file(file_id):
+    _file_row(file_id).delete()
+    return True
+
+
+###########################################################
+# Retention
+
+
+def export_group(filename):
+    """(export kind, classroom) for an exported filename; unknown names group by filename."""
+    for kind, pattern in EXPORT_KINDS:
+        match = pattern.match(filename or "")
+        if match:
+            return kind, match.groupdict().get("classroom")
+    return filename, None
+
+
+def _retention_policy(kind):
+    return {**DEFAULT_RETENTION, **RETENTION_POLICIES.get(kind, {})}
+
+
+def _media_size(media):
+    # Media reports its length without fetching the content
+    return media.length if media is not None else 0
+
+
+def _as_utc(value):
+    """An aware UTC datetime; naive values are taken to be UTC already."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=anvil.tz.tzutc())
+    return value.astimezone(anvil.tz.tzutc())
+
+
+def files_to_prune(now=None):
+    """
+    Export rows that fall outside their retention policy, oldest first.
+    Only metadata columns are fetched.
+    """
+    # Datetimes read back from data tables are timezone-aware, so compare in UTC
+    now = _as_utc(now or datetime.now(anvil.tz.tzutc()))
+    referenced = {
+        task_row["output_filename"]
+        for task_row in app_tables.background_tasks_table.search(
+            q.fetch_only("output_filename")
+        )
+        if task_row["output_filename"]
+    }
+
+    groups = {}
+    for file_row in app_tables.files.search(
+        q.fetch_only("filename", "file_type", "created"),
+        tables.order_by("created", ascending=False),
+        file_type=q.any_of(*EXPORT_FILE_TYPES),
+    ):
+        groups.setdefault(export_group(file_row["filename"]), []).append(file_row)
+
+    expired = []
+    for (kind, classroom), file_rows in groups.items():
+        policy = _retention_policy(kind)
+        cutoff = now - timedelta(days=policy["max_age_days"])
+        for rank, file_row in enumerate(file_rows):
+            if file_row["filename"] in referenced:
+                continue
+            created = file_row["created"]
+            too_old = created is not None and _as_utc(created) < cutoff
+            if rank >= policy["keep_latest"] or too_old:
+                expired.append(file_row)
+    expired.reverse()
+    return expired
+
+
+@in_transaction
+def _delete_batch(file_rows):
+    reclaimed = 0
+    for file_row in file_rows:
+        reclaimed += _media_size(file_row["file"])
+        file_row.delete()
+    return reclaimed
+
+
+@anvil.server.background_task
+def prune_stored_files(dry_run=False):
+    """
+    Delete exports outside their retention policy, RETENTION_BATCH_SIZE per transaction.
+
+    Args:
+        dry_run (bool): Only report what would be deleted
+
+    Returns:
+        dict: files (number deleted), bytes (media size reclaimed) and dry_run
+    """
+    expired = files_to_prune()
+    reclaimed = 0
+    if dry_run:
+        reclaimed = sum(_media_size(file_row["file"]) for file_row in expired)
+    else:
+        for start in range(0, len(expired), RETENTION_BATCH_SIZE):
+            reclaimed += _delete_batch(expired[start : start + RETENTION_BATCH_SIZE])
+    log.info(
+        "%s %s files, %s bytes",
+        "Would prune" if dry_run else "Pruned",
+        len(expired),
+        reclaimed,
+    )
+    return {"files": len(expired), "bytes": reclaimed, "dry_run": dry_run}
@@ -0,0 +1,277 @@
+"""
+Heatmap Images Module
+
+Renders the availability heatmap on the server as SVG or PNG (via matplotlib)
+for read-only views and emailed digests, so the client only has to display an
+image.
+
+Images are cached in the heatmap_images table, keyed by a hash of the format,
+the days shown, the instructors (id, display order and name) and a data
+version: each instructor's availability_version (bumped whenever their
+seven-month availability is written) plus the app config_version. The key is
+worked out from those small columns alone, so a hit never loads or processes
+the availability itself. Each hit refreshes the row's last_used, and the least recently used rows are
+deleted once there are more than HEATMAP_IMAGE_CACHE_SIZE.
+pregenerate_heatmap_images (scheduled nightly) renders the next two weeks ahead
+of time.
+"""
+
+import anvil
+import anvil.server
+import anvil.tz
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables, in_transaction
+from .globals import HEATMAP_CODE_LABELS, HEATMAP_CODE_COLOURS
+from .instructor_AVAILABILITY import (
+    process_instructor_availability,
+    heatmap_dates,
+    availability_versions,
+)
+from .app_config import config_version
+from .app_logging import get_logger
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+import hashlib
+import io
+import json
+
+log = get_logger(__name__)
+
+# Most images kept in heatmap_images before the least recently used are deleted
+HEATMAP_IMAGE_CACHE_SIZE = 200
+# Days rendered ahead by pregenerate_heatmap_images
+PREGENERATE_DAYS = 14
+IMAGE_FORMATS = ("svg", "png")
+
+CELL_WIDTH = 72
+CELL_HEIGHT = 40
+LEFT_MARGIN = 140
+TOP_MARGIN = 90
+
+
+def _now():
+    return datetime.now(anvil.tz.tzutc())
+
+
+def image_cache_key(instructors, start_date, image_format):
+    """Cache key for the heatmap of these instructors on start_date, in image_format."""
+    versions = availability_versions(instructors)
+    # Column order and labels come from display_order and firstName, so they are part of the key
+    instructor_keys = sorted(
+        (
+            instructor.get_id(),
+            instructor["display_order"],
+            instructor["firstName"],
+            versions.get(instructor.get_id()),
+        )
+        for instructor in instructors
+    )
+    payload = json.dumps(
+        [
+            image_format,
+            [day.isoformat() for day in heatmap_dates(start_date)],
+            instructor_keys,
+            config_version(),
+        ]
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+###########################################################
+# Rendering
+
+
+def render_heatmap_svg(heatmap):
+    """SVG document for a process_instructor_availability payload."""
+    rows = heatmap["z_values"]
+    width = LEFT_MARGIN + CELL_WIDTH * len(heatmap["x_labels"]) + 20
+    height = TOP_MARGIN + CELL_HEIGHT * len(rows) + 20
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        'font-family="sans-serif" font-size="10">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+    ]
+    for col, label in enumerate(heatmap["x_labels"]):
+        x = LEFT_MARGIN + CELL_WIDTH * col + CELL_WIDTH / 2
+        parts.append(
+            f'<text x="{x}" y="{TOP_MARGIN - 8}" transform="rotate(-45 {x} {TOP_MARGIN - 8})">'
+            f"{escape(label)}</text>"
+        )
+    for row_index, (label, row) in enumerate(zip(heatmap["y_labels"], rows)):
+        y = TOP_MARGIN + CELL_HEIGHT * row_index
+        parts.append(
+            f'<text x="{LEFT_MARGIN - 6}" y="{y + CELL_HEIGHT / 2 + 3}" text-anchor="end">'
+            f"{escape(label)}</text>"
+        )
+        for col, code in enumerate(row):
+            if code is None:
+                continue
+            x = LEFT_MARGIN + CELL_WIDTH * col
+            parts.append(
+                f'<rect x="{x}" y="{y}" width="{CELL_WIDTH}" height="{CELL_HEIGHT}" '
+                f'fill="{HEATMAP_CODE_COLOURS[code]}" stroke="white"/>'
+            )
+            lines = HEATMAP_CODE_LABELS[code].split("<br>")
+            first_line_y = y + CELL_HEIGHT / 2 + 3 - 6 * (len(lines) - 1)
+            for line_index, line in enumerate(lines):
+                parts.append(
+                    f'<text x="{x + CELL_WIDTH / 2}" y="{first_line_y + 12 * line_index}" '
+                    f'text-anchor="middle" fill="white">{escape(line)}</text>'
+                )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_heatmap_png(heatmap):
+    """PNG bytes for a process_instructor_availability payload."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import ListedColormap
+
+    rows = [[-1 if code is None else code for code in row] for row in heatmap["z_values"]]
+    fig, ax = plt.subplots(
+        figsize=(1.5 + 0.9 * len(heatmap["x_labels"]), 1.2 + 0.5 * len(rows))
+    )
+    ax.imshow(
+        rows,
+        cmap=ListedColormap(["white"] + HEATMAP_CODE_COLOURS),
+        vmin=-1,
+        vmax=len(HEATMAP_CODE_COLOURS) - 1,
+        aspect="auto",
+    )
+    for row_index, row in enumerate(rows):
+        for col, code in enumerate(row):
+            if code >= 0:
+                ax.text(
+                    col,
+                    row_index,
+                    HEATMAP_CODE_LABELS[code].replace("<br>", "\n"),
+                    ha="center",
+                    va="center",
+                    color="white",
+                    fontsize=7,
+                )
+    ax.set_xticks(range(len(heatmap["x_labels"])), heatmap["x_labels"], rotation=-45)
+    ax.set_yticks(range(len(rows)), heatmap["y_labels"])
+    ax.xaxis.tick_top()
+    output = io.BytesIO()
+    fig.savefig(output, format="png", bbox_inches="tight", dpi=100)
+    plt.close(fig)
+    return output.getvalue()
+
+
+def _render(heatmap, image_format, name):
+    if image_format == "png":
+        return anvil.BlobMedia("image/png", render_heatmap_png(heatmap), name=f"{name}.png")
+    return anvil.BlobMedia(
+        "image/svg+xml", render_heatmap_svg(heatmap).encode("utf-8"), name=f"{name}.svg"
+    )
+
+
+###########################################################
+# Cache
+
+
+def _cached_image_row(key):
+    # search rather than get, so a duplicate left by an older build can't make the lookup raise
+    return next(iter(app_tables.heatmap_images.search(cache_key=key)), None)
+
+
+@in_transaction
+def _store_image(key, image_format, image):
+    """
+    Add the rendered image under key, unless another request stored it first.
+    The check and the insert share a transaction, so each key gets one row.
+
+    Returns:
+        Media: The stored image
+    """
+    image_row = _cached_image_row(key)
+    if image_row:
+        return image_row["image"]
+    app_tables.heatmap_images.add_row(
+        cache_key=key,
+        image_format=image_format,
+        image=image,
+        created=_now(),
+        last_used=_now(),
+    )
+    return image
+
+
+def _evict_least_recently_used():
+    cached = app_tables.heatmap_images.search(
+        q.fetch_only("last_used"), tables.order_by("last_used", ascending=False)
+    )
+    stale = cached[HEATMAP_IMAGE_CACHE_SIZE:]
+    for image_row in stale:
+        image_row.delete()
+    if stale:
+        log.info("Evicted %s heatmap images", len(stale))
+
+
+def heatmap_image(instructors, start_date, image_format="svg"):
+    """
+    The heatmap as media, from heatmap_images or built, rendered and stored.
+
+    Returns:
+        Media: The image, or None if there is no availability to show
+    """
+    instructors = list(instructors)
+    key = image_cache_key(instructors, start_date, image_format)
+    image_row = _cached_image_row(key)
+    if image_row:
+        image_row.update(last_used=_now())
+        return image_row["image"]
+
+    heatmap = process_instructor_availability(instructors, start_date)
+    if not heatmap:
+        return None
+    # Rendered outside the transaction, which only covers the check and insert
+    image = _render(heatmap, image_format, f"availability_{start_date.isoformat()}")
+    image = _store_image(key, image_format, image)
+    _evict_least_recently_used()
+    return image
+
+
+def _all_instructors():
+    return app_tables.users.search(
+        tables.order_by("display_order", ascending=True), is_instructor=True
+    )
+
+
+@anvil.server.callable
+def get_heatmap_image(start_date=None, instructors=None, image_format="svg"):
+    """
+    The availability heatmap for a day as an image.
+
+    Args:
+        start_date (date): Day to show (default: today)
+        instructors (list): Instructor rows to include (default: all, in display order)
+        image_format (str): "svg" or "png"
+
+    Returns:
+        Media: The rendered image, or None if there is no availability to show
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"image_format must be one of {IMAGE_FORMATS}")
+    start_date = start_date or datetime.now().date()
+    return heatmap_image(
+        instructors if instructors is not None else _all_instructors(), start_date, image_format
+    )
+
+
+@anvil.server.background_task
+def pregenerate_heatmap_images(days=PREGENERATE_DAYS, image_format="svg"):
+    """Render the all-instructor heatmap for each of the next `days` days into the cache."""
+    instructors = list(_all_instructors())
+    today = datetime.now().date()
+    rendered = 0
+    for offset in range(days):
+        if heatmap_image(instructors, today + timedelta(days=offset), image_format):
+            rendered += 1
+    log.info("Pregenerated %s heatmap images", rendered)
+    return rendered
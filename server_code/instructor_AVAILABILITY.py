@@ -6,252 +6,335 @@ Instructor Availability Server Module
 This module handles instructor availability processing and scheduling.
 """
 
-import anvil.files
-from anvil.files import data_files
 import anvil.users
 import anvil.tables as tables
 import anvil.tables.query as q
-from anvil.tables import app_tables
+from .data_access import app_tables
 import anvil.server
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from .globals import LESSON_SLOTS, AVAILABILITY_MAPPING, days_full
+from .globals import LESSON_SLOTS, AVAILABILITY_MAPPING, HEATMAP_CODE_LABELS, days_full
+from .app_logging import get_logger, flush_logs
+from .vacations import vacation_index
+from .availability_bits import roster_masks, covered_slots, status_flags, CAN_DRIVE, CAN_CLASS
+from .app_config import lesson_slots, config_version
 import io
 import json
+import time
+
+log = get_logger(__name__)
 
 # Define availability mapping
 availability_mapping = AVAILABILITY_MAPPING
 days_of_week = days_full
 
 
-@anvil.server.callable
-def process_instructor_availability(instructors, start_date=None):
-    """Process instructor availability data and return formatted schedule.
+def _twelve_hour(time_str):
+    return datetime.strptime(time_str, "%H:%M").strftime("%I:%M %p")
 
-    Args:
-        instructors (list): List of instructor objects
-        start_date (date): Start date for calculation (default: today)
+
+# config_version -> (slot labels, heatmap slot order) for the configured lesson slots
+_slot_labels = {}
+
+
+def heatmap_slot_labels():
+    """
+    Heatmap row label for each bookable slot, and the slots in row order.
+    Rows run from the latest slot down, as the y axis is drawn bottom-up.
+    Rebuilt when the config changes.
 
     Returns:
-        dict: Dictionary containing availability data for heatmap display
+        tuple: (slot name -> time label, slot names in row order)
     """
-    if start_date is None:
-        start_date = datetime.now().date()
+    version = config_version()
+    if version not in _slot_labels:
+        slots = lesson_slots()
+        labels = {
+            slot_name: f"{_twelve_hour(slot_info['start_time'])}-{_twelve_hour(slot_info['end_time'])}"
+            for slot_name, slot_info in slots.items()
+            if not slot_name.startswith("break_")
+        }
+        order = sorted(labels, key=lambda slot_name: slots[slot_name]["start_minute"], reverse=True)
+        _slot_labels.clear()
+        _slot_labels[version] = (labels, order)
+    return _slot_labels[version]
+
 
-    # Calculate the start of the week (Monday) for the given start_date
+HEATMAP_CODES = range(len(HEATMAP_CODE_LABELS))
+# Instructors drawn per heatmap page when all instructors are shown
+HEATMAP_PAGE_SIZE = 12
+MAX_HEATMAP_PAGE_SIZE = 50
+# Seconds the roster-wide heatmap rows and totals for a day are reused between pages
+HEATMAP_TOTALS_TTL = 300
+
+
+def _status_code(status):
+    # Seven-month availability already holds numeric codes; older data holds labels
+    code = status if isinstance(status, (int, float)) else availability_mapping.get(status, -1)
+    if code not in HEATMAP_CODES:
+        log.warning("Found invalid availability value: %s", status, every=100)
+        return 0
+    return int(code)
+
+
+def heatmap_dates(start_date):
     # Changed timne delta to one to only show two days
     start_of_week = start_date  # - timedelta(days=start_date.weekday()) replace this to revert to week display
     end_of_week = start_of_week + timedelta(days=0)
+    dates = []
+    day = start_of_week
+    while day <= end_of_week:
+        dates.append(day)
+        day += timedelta(days=1)
+    return dates
 
-    all_records = []
 
-    for instructor in instructors:
-        try:
-            instructor_schedule = app_tables.instructor_schedules.get(
-                instructor=instructor
-            )
-            # Get the current seven month availability data
-            availability_data = instructor_schedule["current_seven_month_availability"]
-            if availability_data is None or availability_data == "":
-                continue
-        except (KeyError, TypeError) as e:
-            availability_data = {}
-            continue
+def _load_schedules(instructors):
+    """Instructor row id -> instructor_schedules row, in one search."""
+    if not instructors:
+        return {}
+    return {
+        schedule["instructor"].get_id(): schedule
+        for schedule in app_tables.instructor_schedules.search(
+            instructor=q.any_of(*instructors)
+        )
+    }
 
-        # Process each date in the availability data, but only for the target week
-        for date_str, slots in availability_data.items():
-            date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-            # Skip if date is not in our target week
-            if date < start_of_week or date > end_of_week:
+def _availability_columns(instructors, dates, schedules):
+    """
+    Returns:
+        tuple: ({(date, instructor position): {slot: code}} for each column with data,
+                set of slots seen)
+    """
+    columns = {}
+    slot_labels, _ = heatmap_slot_labels()
+    used_slots = set()
+    for position, instructor in enumerate(instructors):
+        schedule = schedules.get(instructor.get_id())
+        availability_data = schedule["current_seven_month_availability"] if schedule else None
+        if not availability_data:
+            continue
+        for day in dates:
+            slots = availability_data.get(day.isoformat())
+            if not slots:
                 continue
+            codes = {
+                slot_name: _status_code(status)
+                for slot_name, status in slots.items()
+                if slot_name in slot_labels
+            }
+            if codes:
+                columns[(day, position)] = codes
+                used_slots.update(codes)
+    return columns, used_slots
 
-            # Get the day of week (0-6, where 0 is Monday)
-            day_name = date.strftime("%A").lower()
-            day_index = date.weekday()
-
-            for slot_name, status in slots.items():
-                if slot_name in LESSON_SLOTS:
-                    try:
-                        # The status is already a numeric value from the seven-month availability
-                        value = (
-                            status
-                            if isinstance(status, (int, float))
-                            else availability_mapping.get(status, -1)
-                        )
-                        all_records.append(
-                            {
-                                "instructor": instructor["firstName"],
-                                "display_order": instructor['display_order'],
-                                "day_index": day_index,
-                                "day_name": day_name,
-                                "slot": slot_name,
-                                "start_time": LESSON_SLOTS[slot_name]["start_time"],
-                                "end_time": LESSON_SLOTS[slot_name]["end_time"],
-                                "status": status,
-                                "value": value,
-                            }
-                        )
-
-                    except (KeyError, TypeError) as e:
-                        print(f"Error with slot {slot_name}: {e}")
-                        continue
-
-    # Process the data with pandas
-    df = pd.DataFrame(all_records)
-
-    if df.empty:
-        return None
-
-    # Validate that all values are within expected range (0-6)
-    invalid_values = df[~df["value"].isin(range(7))]["value"].unique()
-    if len(invalid_values) > 0:
-        print(f"Warning: Found invalid availability values: {invalid_values}")
-        # Replace invalid values with 0 (Unavailable)
-        df.loc[~df["value"].isin(range(7)), "value"] = 0
-
-    # Create a pivot table for the heatmap: slots vs days
-    pivot_df = df.pivot_table(
-        values="value",
-        index=["slot", "start_time", "end_time"],
-        columns=["day_name", "instructor"],
-        aggfunc="first",
-    )
 
-    # Filter out break slots from the pivot table
-    break_slots = ["break_am", "break_lunch", "break_pm"]
-    pivot_df = pivot_df[~pivot_df.index.get_level_values("slot").isin(break_slots)]
-
-    # Sort by start time
-    pivot_df = pivot_df.sort_values(by=["start_time"], ascending=False)
-
-    # Create flattened day-instructor labels
-    # Order is alphabetical here
-    # Define day order
-    day_order = {
-      "monday": 0,
-      "tuesday": 1,
-      "wednesday": 2,
-      "thursday": 3,
-      "friday": 4,
-      "saturday": 5,
-      "sunday": 6,
-    }
-    
-    # Sort pivot_df columns correctly
-    instructor_display_order = (
-      df[["instructor", "display_order"]]
-      .drop_duplicates()
-      .set_index("instructor")["display_order"]
-      .to_dict()
-    )
-    
-    ordered_columns = sorted(
-      pivot_df.columns,
-      key=lambda x: (day_order.get(x[0], 99), instructor_display_order.get(x[1], 999))
-    )
-    
-    pivot_df = pivot_df[ordered_columns]
-    
-    # Now use ordered_columns to generate flat_columns and z_values
-    flat_columns = [(day, instructor, f"{instructor}") for (day, instructor) in ordered_columns]
-
-
-    # Extract just the formatted labels
-    flat_labels = [item[2] for item in flat_columns]
-
-    # Reorder the z-values to match the new column order
-    z_values_ordered = []
-    for row in pivot_df.values.tolist():
-        # Create a new row with values in the correct order
-        new_row = []
-        for day, instructor, _ in flat_columns:
-            col_idx = list(pivot_df.columns).index((day, instructor))
-            new_row.append(row[col_idx])
-        z_values_ordered.append(new_row)
-
-    # After creating the pivot table, reorder the columns
-    instructor_order = {
-        instructor["firstName"]: idx for idx, instructor in enumerate(instructors)
-    }
+def _heatmap_payload(instructors, columns, heatmap_slots):
+    slot_labels, _ = heatmap_slot_labels()
+    # Columns by day, then instructor display order
     ordered_columns = sorted(
-        pivot_df.columns, key=lambda x: (day_order[x[0]], instructor_order[x[1]])
+        columns,
+        key=lambda key: (
+            key[0],
+            instructors[key[1]]["display_order"] is None,
+            instructors[key[1]]["display_order"] or 0,
+        ),
     )
-    pivot_df = pivot_df[ordered_columns]
-
-    # Convert to the format expected by the client
-    data = {
-        "z_values": z_values_ordered,
-        "x_labels": flat_labels,
-        "y_labels": [
-            f"{datetime.strptime(start_time, '%H:%M').strftime('%I:%M %p')}-{datetime.strptime(end_time, '%H:%M').strftime('%I:%M %p')}"
-            for slot, start_time, end_time in pivot_df.index
+    return {
+        "z_values": [
+            [columns[key].get(slot_name) for key in ordered_columns]
+            for slot_name in heatmap_slots
         ],
+        "x_labels": [instructors[position]["firstName"] for _, position in ordered_columns],
+        "y_labels": [slot_labels[slot_name] for slot_name in heatmap_slots],
         "instructors": [i["firstName"] for i in instructors],
     }
-    return data
 
 
 @anvil.server.callable
-def get_max_drive_slots(date):
+def process_instructor_availability(instructors, start_date=None):
+    """Process instructor availability data and return formatted schedule.
+
+    Args:
+        instructors (list): List of instructor objects
+        start_date (date): Start date for calculation (default: today)
+
+    Returns:
+        dict: Heatmap payload, or None if no instructor has availability for the day
+            z_values (list): One row of integer codes per slot (None where no data);
+                codes index HEATMAP_CODE_LABELS / HEATMAP_CODE_COLOURS in globals
+            x_labels (list): Instructor name per column
+            y_labels (list): Slot time label per row
+            instructors (list): firstNames of the requested instructors
     """
-    Calculate maximum available drive slots for a given date.
-    Uses the existing process_instructor_availability function to get availability data.
+    if start_date is None:
+        start_date = datetime.now().date()
+
+    instructors = list(instructors)
+    columns, used_slots = _availability_columns(
+        instructors, heatmap_dates(start_date), _load_schedules(instructors)
+    )
+    if not columns:
+        return None
+    slot_order = heatmap_slot_labels()[1]
+    heatmap_slots = [slot_name for slot_name in slot_order if slot_name in used_slots]
+    return _heatmap_payload(instructors, columns, heatmap_slots)
+
+
+@anvil.server.callable
+def get_heatmap_page(start_date=None, offset=0, limit=HEATMAP_PAGE_SIZE):
+    """
+    One window of the all-instructor heatmap, plus per-slot totals over every instructor,
+    so the client only ever draws `limit` instructors whatever the roster size.
+
+    Args:
+        start_date (date): Day to show (default: today)
+        offset (int): Position of the first instructor in display order
+        limit (int): Instructors per page, up to MAX_HEATMAP_PAGE_SIZE
+
+    Returns:
+        dict:
+            heatmap (dict): process_instructor_availability payload for the window (None if no data)
+            y_labels (list): Slot time label per row, the same for every page
+            drive_capable (list): Instructors available to drive, per row
+            class_capable (list): Instructors available to teach a class, per row
+            offset, limit, total (int): Window position and roster size
     """
-    # Get all instructors
     instructors = app_tables.users.search(
         tables.order_by("display_order", ascending=True), is_instructor=True
     )
+    return heatmap_page(instructors, start_date, offset, limit)
 
-    # Get availability data for the week containing the date
-    availability_data = process_instructor_availability(instructors, date)
 
-    if not availability_data:
-        return 0
+def availability_versions(instructors):
+    """Instructor row id -> availability_version, without loading the availability."""
+    if not instructors:
+        return {}
+    return {
+        schedule["instructor"].get_id(): schedule["availability_version"] or 0
+        for schedule in app_tables.instructor_schedules.search(
+            q.fetch_only("instructor", "availability_version"),
+            instructor=q.any_of(*instructors),
+        )
+    }
 
-    # Count available drive slots
-    drive_slots = 0
-    for slot_info in availability_data["y_labels"]:
-        # Check if any instructor is available for this slot
-        slot_index = availability_data["y_labels"].index(slot_info)
-        for instructor_availability in availability_data["z_values"][slot_index]:
-            if instructor_availability in [1, 2]:  # 1 means "Yes", 2 means "Drive Only"
-                drive_slots += 1
-                break  # Count each slot only once if at least one instructor is available
 
-    return drive_slots
+# (day, config_version, roster (instructor id, availability_version) pairs) -> (built at, totals)
+_heatmap_totals = {}
 
 
-@anvil.server.callable
-def get_max_class_slots(date):
+def heatmap_totals(instructors, day):
     """
-    Calculate maximum available class slots for a given date.
-    Uses the existing process_instructor_availability function to get availability data.
+    Heatmap rows and per-row counts over the whole roster for one day.
+    Kept for HEATMAP_TOTALS_TTL seconds, so paging through the heatmap only
+    loads the schedules of the instructors on each page. The key includes each
+    instructor's availability_version, so saved availability shows at once.
+
+    Args:
+        instructors (list): The whole roster
+        day (date): Day shown
+
+    Returns:
+        dict:
+            slots (list): Slot names with data, in heatmap row order
+            drive_capable (list): Instructors available to drive, per row
+            class_capable (list): Instructors available to teach a class, per row
     """
-    # Get all instructors
-    instructors = app_tables.users.search(
-        tables.order_by("display_order", ascending=True), is_instructor=True
+    now = time.monotonic()
+    versions = availability_versions(instructors)
+    key = (
+        day,
+        config_version(),
+        tuple((instructor.get_id(), versions.get(instructor.get_id())) for instructor in instructors),
     )
+    cached = _heatmap_totals.get(key)
+    if cached and now - cached[0] <= HEATMAP_TOTALS_TTL:
+        return cached[1]
 
-    # Get availability data for the week containing the date
-    availability_data = process_instructor_availability(instructors, date)
+    columns, used_slots = _availability_columns(
+        instructors, heatmap_dates(day), _load_schedules(instructors)
+    )
+    slot_order = heatmap_slot_labels()[1]
+    heatmap_slots = [slot_name for slot_name in slot_order if slot_name in used_slots]
+    totals = {
+        "slots": heatmap_slots,
+        "drive_capable": [
+            sum(1 for codes in columns.values() if status_flags(codes.get(slot_name)) & CAN_DRIVE)
+            for slot_name in heatmap_slots
+        ],
+        "class_capable": [
+            sum(1 for codes in columns.values() if status_flags(codes.get(slot_name)) & CAN_CLASS)
+            for slot_name in heatmap_slots
+        ],
+    }
+    # Drop expired days so the cache only holds recently viewed ones
+    for stale_key in [
+        k for k, (built_at, _) in _heatmap_totals.items() if now - built_at > HEATMAP_TOTALS_TTL
+    ]:
+        del _heatmap_totals[stale_key]
+    _heatmap_totals[key] = (now, totals)
+    return totals
 
-    if not availability_data:
-        return 0
 
-    # Count available class slots
-    class_slots = 0
-    for slot_info in availability_data["y_labels"]:
-        # Check if any instructor is available for this slot
-        slot_index = availability_data["y_labels"].index(slot_info)
-        for instructor_availability in availability_data["z_values"][slot_index]:
-            if instructor_availability in [1, 3]:  # 1 means "Yes", 3 means "Class Only"
-                class_slots += 1
-                break  # Count each slot only once if at least one instructor is available
+def heatmap_page(instructors, start_date=None, offset=0, limit=HEATMAP_PAGE_SIZE):
+    """get_heatmap_page for an already loaded roster (instructors in display order)."""
+    if start_date is None:
+        start_date = datetime.now().date()
+    limit = max(1, min(limit, MAX_HEATMAP_PAGE_SIZE))
+
+    instructors = list(instructors)
+    # Rows come from the whole roster so they line up from page to page
+    totals = heatmap_totals(instructors, start_date)
+    heatmap_slots = totals["slots"]
+    slot_labels = heatmap_slot_labels()[0]
+
+    window = instructors[offset : offset + limit]
+    window_columns, _ = _availability_columns(
+        window, heatmap_dates(start_date), _load_schedules(window)
+    )
+    return {
+        "heatmap": _heatmap_payload(window, window_columns, heatmap_slots) if window_columns else None,
+        "y_labels": [slot_labels[slot_name] for slot_name in heatmap_slots],
+        "drive_capable": totals["drive_capable"],
+        "class_capable": totals["class_capable"],
+        "offset": offset,
+        "limit": limit,
+        "total": len(instructors),
+    }
+
+
+def _roster_day_masks(date):
+    """(drive, class_, occupied) mask arrays for every instructor with availability on date."""
+    instructors = list(app_tables.users.search(is_instructor=True))
+    date_str = date.isoformat()
+    return roster_masks(
+        (schedule["current_seven_month_availability"] or {}).get(date_str)
+        for schedule in _load_schedules(instructors).values()
+        if schedule["current_seven_month_availability"]
+    )
+
+
+@anvil.server.callable
+def get_max_drive_slots(date):
+    """
+    Calculate maximum available drive slots for a given date:
+    the slots where at least one instructor can drive.
+    """
+    drive, _, _ = _roster_day_masks(date)
+    return covered_slots(drive)
 
-    return class_slots
+
+@anvil.server.callable
+def get_max_class_slots(date):
+    """
+    Calculate maximum available class slots for a given date:
+    the slots where at least one instructor can teach a class.
+    """
+    _, class_, _ = _roster_day_masks(date)
+    return covered_slots(class_)
 
 
 @anvil.server.callable
@@ -373,7 +456,9 @@ def generate_capacity_report(days=180):
         output.getvalue(),
         name=filename,
     )
-    app_tables.files.add_row(filename=filename, file=excel_media, file_type="Excel")
+    app_tables.files.add_row(
+        filename=filename, file=excel_media, file_type="Excel", created=datetime.now()
+    )
     if excel_media:
       result = True
       return result, filename
@@ -392,13 +477,12 @@ def generate_seven_month_availability(instructor=None):
     """
     if instructor is None:
         instructor = app_tables.users.get(firstName="Tony")
-        print(instructor)
-    print(f"Generating seven-month availability for {instructor['firstName']}")
+    log.debug("Generating seven-month availability for %s", instructor["firstName"])
 
     # Get instructor's weekly availability
     instructor_schedule = app_tables.instructor_schedules.get(instructor=instructor)
     if not instructor_schedule or not instructor_schedule["weekly_availability_term"]:
-        print(f"No weekly availability found for {instructor['firstName']}")
+        log.warning("No weekly availability found for %s", instructor["firstName"])
         return None
 
     # Get existing availability
@@ -419,7 +503,7 @@ def generate_seven_month_availability(instructor=None):
             if last_date >= target_end_date:
                 return None
         except (ValueError, TypeError) as e:
-            print(f"Error checking existing availability: {e}")
+            log.warning("Error checking existing availability: %s", e)
             # Continue with generation if there's an error checking dates
 
     # Save current schedule as previous before updating
@@ -430,46 +514,8 @@ def generate_seven_month_availability(instructor=None):
 
     weekly_data = instructor_schedule["weekly_availability_term"]["weekly_availability"]
 
-    # Get personal vacation days and parse from JSON string if needed
-    vacation_data = instructor_schedule["vacation_days"]
-
-    # Initialize empty vacation days list
-    vacation_days = []
-
-    # Only process if we have vacation data and it's not empty
-    if vacation_data and vacation_data != {}:
-        if isinstance(vacation_data, str):
-            try:
-                vacation_data = json.loads(vacation_data)
-            except json.JSONDecodeError:
-                print(f"Error parsing vacation days JSON for {instructor['firstName']}")
-                vacation_data = {"vacation_days": []}
-
-        # Extract the actual vacation days list from the nested structure
-        vacation_days = vacation_data.get("vacation_days", [])
-
-    # Create vacation date ranges
-    vacation_ranges = []
-    if vacation_days and isinstance(vacation_days, list):  # Ensure we have a valid list
-        for vacation in vacation_days:
-            try:
-                if not isinstance(vacation, dict):
-                    continue
-                start_date = datetime.strptime(
-                    vacation.get("start_date", ""), "%Y-%m-%d"
-                ).date()
-                end_date = datetime.strptime(
-                    vacation.get("end_date", ""), "%Y-%m-%d"
-                ).date()
-                current_date = start_date
-                while current_date <= end_date:
-                    vacation_ranges.append(str(current_date))
-                    current_date += timedelta(days=1)
-            except (KeyError, ValueError, AttributeError) as e:
-                print(
-                    f"Error processing vacation date range for {instructor['firstName']}: {e}"
-                )
-                continue
+    # Personal vacations as merged intervals
+    vacations = vacation_index(instructor_schedule["vacation_days"], instructor["firstName"])
 
     # Calculate the target end date (8 months from today)
     today = datetime.now().date()
@@ -485,7 +531,7 @@ def generate_seven_month_availability(instructor=None):
             )
             start_date = last_date + timedelta(days=1)
         except (ValueError, TypeError) as e:
-            print(f"Error finding last date: {e}")
+            log.warning("Error finding last date: %s", e)
             start_date = today
     else:
         start_date = today
@@ -506,7 +552,7 @@ def generate_seven_month_availability(instructor=None):
         day_name = date.strftime("%A").lower()
 
         # Check if it's a vacation day
-        if date_str in vacation_ranges:
+        if date in vacations:
             new_availability[date_str] = {
                 slot: availability_mapping["Vacation"] for slot in LESSON_SLOTS.keys()
             }
@@ -524,7 +570,11 @@ def generate_seven_month_availability(instructor=None):
     # Merge existing and new availability
     merged_availability = {**existing_availability, **new_availability}
 
-    instructor_schedule.update(current_seven_month_availability=merged_availability)
+    # availability_version tells cached heatmap images the data has changed
+    instructor_schedule.update(
+        current_seven_month_availability=merged_availability,
+        availability_version=(instructor_schedule["availability_version"] or 0) + 1,
+    )
     return merged_availability
 
 
@@ -542,5 +592,6 @@ def update_all_instructor_seven_month_availability():
         return False
     for instructor in instructors:
         generate_seven_month_availability(instructor)
-        print(f"Updated availability for {instructor['firstName']}")
+        log.info("Updated availability for %s", instructor["firstName"])
+    flush_logs()
     return True
@@ -1,35 +1,54 @@
 import anvil.server
 import anvil.tables as tables
 import anvil.tables.query as q
-from anvil.tables import app_tables
+from .data_access import app_tables
 from datetime import datetime
 from .globals import LESSON_SLOTS, AVAILABILITY_MAPPING
+from .background_tasks import enqueue_task, report_progress, finish_task, TaskMetrics
+from .utilities_server import export_merged_classroom_schedule
+from .app_logging import get_logger, set_correlation_id
+from .sessions import write_classroom_sessions
+from .conflicts import check_classroom_conflicts
+from .availability_bits import status_flags, CAN_CLASS, CAN_DRIVE
+
+log = get_logger(__name__)
 
 @anvil.server.callable
-def schedule_instructors_for_classroom(classroom_name, instructor1, instructor2, instructor3, task_id):
-  anvil.server.launch_background_task('schedule_instructors_for_classroom_and_export_background', classroom_name, instructor1, instructor2, instructor3, task_id)
+def schedule_instructors_for_classroom(classroom_name, instructor1, instructor2, instructor3):
+  # Queued per classroom, and locked on each instructor so two classrooms
+  # can't book the same instructor from stale availability at the same time
+  instructor_ids = [instructor1.get_id(), instructor2.get_id(), instructor3.get_id()]
+  return enqueue_task(
+    'schedule_instructors_for_classroom_and_export_background',
+    {'classroom_name': classroom_name, 'instructor_ids': instructor_ids},
+    idempotency_key=f"schedule_instructors:{classroom_name}",
+    resource_keys=[f"classroom:{classroom_name}"] + [f"instructor:{i}" for i in instructor_ids],
+  )
 
 @anvil.server.background_task
-def schedule_instructors_for_classroom_and_export_background(classroom_name, instructor1, instructor2, instructor3, task_id):
-  print("Checking for classroom")
+def schedule_instructors_for_classroom_and_export_background(classroom_name, instructor_ids, task_id):
+  set_correlation_id(task_id)
+  log.info("Scheduling instructors for %s", classroom_name)
+  metrics = TaskMetrics()
   try:
-    classroom = app_tables.classrooms.get(classroom_name=classroom_name)
-    print(f"Found {classroom_name}")
-    if not classroom:
-      raise ValueError(f"classroom {classroom_name} not found")
-  
-    print("Checking for instructors")
-    print(instructor1["firstName"])
-    print(instructor2["firstName"])
-    print(instructor3["firstName"])
+    with metrics.stage("load"):
+      classroom = app_tables.classrooms.get(classroom_name=classroom_name)
+      if not classroom:
+        raise ValueError(f"classroom {classroom_name} not found")
   
-    if not instructor1 or not instructor2 or not instructor3:
-      raise ValueError("Some instructors not found")
+      instructor1, instructor2, instructor3 = [
+        app_tables.users.get_by_id(instructor_id) for instructor_id in instructor_ids
+      ]
+      if not instructor1 or not instructor2 or not instructor3:
+        raise ValueError("Some instructors not found")
+      log.debug(
+        "Instructors: %s, %s, %s",
+        instructor1["firstName"], instructor2["firstName"], instructor3["firstName"],
+      )
   
-    print("Checking for instructor schedules")
-    instructor1_schedule = app_tables.instructor_schedules.get(instructor=instructor1)
-    instructor2_schedule = app_tables.instructor_schedules.get(instructor=instructor2)
-    instructor3_schedule = app_tables.instructor_schedules.get(instructor=instructor3)
+      instructor1_schedule = app_tables.instructor_schedules.get(instructor=instructor1)
+      instructor2_schedule = app_tables.instructor_schedules.get(instructor=instructor2)
+      instructor3_schedule = app_tables.instructor_schedules.get(instructor=instructor3)
   
     if not instructor1_schedule or not instructor2_schedule or not instructor3_schedule:
       raise ValueError("Some instructor schedules not found")
@@ -39,59 +58,71 @@ def schedule_instructors_for_classroom_and_export_background(classroom_name, ins
     instructor3_availability = instructor3_schedule["current_seven_month_availability"]
   
     daily_schedules = classroom["complete_schedule"]
-    print("Checked initial info collection")
   
-    daily_schedules = _schedule_classes(
-      daily_schedules,
-      instructor1,
-      instructor2,
-      instructor3,
-      instructor1_availability,
-      instructor2_availability,
-      instructor3_availability,
-    )
+    report_progress(task_id, 20, "Assigning class instructors")
+    with metrics.stage("classes"):
+      daily_schedules = _schedule_classes(
+        daily_schedules,
+        instructor1,
+        instructor2,
+        instructor3,
+        instructor1_availability,
+        instructor2_availability,
+        instructor3_availability,
+      )
   
-    daily_schedules = _schedule_drives(
-      daily_schedules,
-      instructor1,
-      instructor2,
-      instructor3,
-      instructor1_availability,
-      instructor2_availability,
-      instructor3_availability,
-    )
+    report_progress(task_id, 40, "Assigning drive instructors")
+    with metrics.stage("drives"):
+      daily_schedules = _schedule_drives(
+        daily_schedules,
+        instructor1,
+        instructor2,
+        instructor3,
+        instructor1_availability,
+        instructor2_availability,
+        instructor3_availability,
+      )
   
-    classroom.update(complete_schedule_with_instructors=daily_schedules)
+    report_progress(task_id, 55, "Saving instructor schedules")
+    with metrics.stage("save"):
+      classroom.update(complete_schedule_with_instructors=daily_schedules)
   
-    _persist_instructor_availability(instructor1, instructor1_availability)
-    _persist_instructor_availability(instructor2, instructor2_availability)
-    _persist_instructor_availability(instructor3, instructor3_availability)
+      _persist_instructor_availability(instructor1, instructor1_availability)
+      _persist_instructor_availability(instructor2, instructor2_availability)
+      _persist_instructor_availability(instructor3, instructor3_availability)
+
+    with metrics.stage("sessions"):
+      write_classroom_sessions(
+        classroom,
+        daily_schedules,
+        {i["firstName"]: i for i in (instructor1, instructor2, instructor3)},
+      )
+
+    with metrics.stage("conflicts"):
+      conflicts = check_classroom_conflicts(
+        classroom, [i["firstName"] for i in (instructor1, instructor2, instructor3)]
+      )
+    metrics.record_payload("complete_schedule_with_instructors", daily_schedules)
+    metrics.record_payload("instructor_availability", instructor1_availability)
   
     results_message = f"Instructors added to {classroom_name} successfully\n"
-    print("Exporting full schedule with instructors")
-    filename, download_message = anvil.server.call('export_merged_classroom_schedule', classroom_name, 'instructors')
+    if conflicts:
+      results_message += f"Warning: {len(conflicts)} double bookings with other classrooms, e.g. "
+      results_message += ", ".join(f"{c['instructor']} {c['date']} {c['slot']}" for c in conflicts[:3])
+      results_message += "\n"
+    report_progress(task_id, 75, "Exporting schedule")
+    log.debug("Exporting full schedule with instructors")
+    # Called directly so the export is measured in this process
+    with metrics.stage("export"):
+      filename, download_message = export_merged_classroom_schedule(classroom_name, 'instructors')
     results_message += f"Export results: {download_message}"
-    
-    task_row = app_tables.background_tasks_table.get(task_id=task_id)
-    now = datetime.now()
-    if task_row:
-      task_row.update(
-        status='complete',
-        results_text=results_message,
-        end_time=now,
-        output_filename=filename
-    )
+
+    finish_task(task_id, 'complete', results_message, output_filename=filename, metrics=metrics)
   
   except Exception as e:
-    task_row = app_tables.background_tasks_table.get(task_id=task_id)
-    now = datetime.now()
     error_message = f"An error occurred: {e}"
-    if task_row:
-      task_row.update(
-        status='error',
-        results_text=error_message,
-        end_time=now
-      )
+    log.error("Instructor scheduling failed: %s", e, classroom=classroom_name)
+    finish_task(task_id, 'error', error_message, metrics=metrics)
 
 
 def _get_primary_instructor(date_str, instructor1, instructor2, instructor3):
@@ -177,22 +208,14 @@ def _can_teach_class(availability, date_str, slot):
   if date_str not in availability or slot not in availability[date_str]:
     return False
 
-  slot_availability = availability[date_str][slot]
-  return slot_availability in [
-    AVAILABILITY_MAPPING["Yes"],
-    AVAILABILITY_MAPPING["Class Only"],
-  ]
+  return bool(status_flags(availability[date_str][slot]) & CAN_CLASS)
 
 
 def _can_teach_drive(availability, date_str, slot):
   if date_str not in availability or slot not in availability[date_str]:
     return False
 
-  slot_availability = availability[date_str][slot]
-  return slot_availability in [
-    AVAILABILITY_MAPPING["Yes"],
-    AVAILABILITY_MAPPING["Drive Only"],
-  ]
+  return bool(status_flags(availability[date_str][slot]) & CAN_DRIVE)
 
 def _update_instructor_availability(availability, date_str, slot, instructor):
   if date_str in availability and slot in availability[date_str]:
@@ -201,4 +224,7 @@ def _update_instructor_availability(availability, date_str, slot, instructor):
 def _persist_instructor_availability(instructor, availability):
   schedule_row = app_tables.instructor_schedules.get(instructor=instructor)
   if schedule_row:
-    schedule_row.update(current_seven_month_availability=availability)
+    schedule_row.update(
+      current_seven_month_availability=availability,
+      availability_version=(schedule_row["availability_version"] or 0) + 1,
+    )
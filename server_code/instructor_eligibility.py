@@ -0,0 +1,111 @@
+"""
+Instructor Eligibility Module
+
+Which instructors can teach at which school, from their school_preferences.
+
+The school -> instructor index is built from one search of instructor_schedules
+and kept for ELIGIBILITY_INDEX_TTL seconds, so picking a classroom in the
+Scheduler is a single call instead of one instructor_schedules lookup per
+instructor. No server function writes school_preferences (they are edited in
+the instructor_schedules table), so such edits show up once the TTL expires.
+Code that adds instructor_schedules rows calls invalidate_eligibility_index()
+so new instructors are offered on the next lookup.
+"""
+
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables
+from .app_logging import get_logger
+import time
+
+log = get_logger(__name__)
+
+# Seconds a built index is reused before it is rebuilt from the tables
+ELIGIBILITY_INDEX_TTL = 300
+
+_index = None
+_index_built_at = 0
+
+
+def excluded_schools(school_prefs):
+    """
+    Schools an instructor won't teach at.
+    Preferences are stored either as {"no": [...]} or nested as
+    {"school_preferences": {"no": [...]}}; both are accepted.
+    """
+    if not school_prefs:
+        return []
+    if "school_preferences" in school_prefs:
+        school_prefs = school_prefs["school_preferences"] or {}
+    return school_prefs.get("no", [])
+
+
+class EligibilityIndex:
+    """
+    Attributes:
+        instructors (dict): Instructor row id -> users row, for every instructor with a schedule
+        excluded (dict): School abbreviation -> set of instructor row ids that won't teach there
+    """
+
+    __slots__ = ("instructors", "excluded")
+
+    def __init__(self):
+        self.instructors = {}
+        self.excluded = {}
+
+    def add(self, instructor, school_prefs):
+        instructor_id = instructor.get_id()
+        self.instructors[instructor_id] = instructor
+        for school in excluded_schools(school_prefs):
+            self.excluded.setdefault(school, set()).add(instructor_id)
+
+    def eligible_ids(self, school):
+        return self.instructors.keys() - self.excluded.get(school, set())
+
+
+def _build_index():
+    index = EligibilityIndex()
+    for schedule in app_tables.instructor_schedules.search():
+        instructor = schedule["instructor"]
+        if instructor is not None and instructor["is_instructor"]:
+            index.add(instructor, schedule["school_preferences"])
+    log.info("Built eligibility index for %s instructors", len(index.instructors))
+    return index
+
+
+def get_eligibility_index():
+    global _index, _index_built_at
+    if _index is None or time.monotonic() - _index_built_at > ELIGIBILITY_INDEX_TTL:
+        _index = _build_index()
+        _index_built_at = time.monotonic()
+    return _index
+
+
+def invalidate_eligibility_index():
+    global _index
+    _index = None
+
+
+@anvil.server.callable
+def get_eligible_instructors(school):
+    """
+    Instructors who can teach at a school, in display order.
+
+    Args:
+        school (str): School abbreviation (e.g., 'HSS', 'NHS') from app_tables/schools/abbreviation
+
+    Returns:
+        list: Dicts with the instructor row and its firstName and surname
+    """
+    index = get_eligibility_index()
+    instructors = [index.instructors[i] for i in index.eligible_ids(school)]
+    instructors.sort(key=lambda row: (row["display_order"] is None, row["display_order"] or 0))
+    return [
+        {
+            "instructor": instructor,
+            "firstName": instructor["firstName"],
+            "surname": instructor["surname"],
+        }
+        for instructor in instructors
+    ]
@@ -0,0 +1,149 @@
+"""
+Schedule Records Module
+
+Compact record types for class and drive sessions while a classroom is being
+built. Dates are held as ordinals (date.toordinal()) and slots as indices into
+SLOT_NAMES, so the scheduling loops compare and hash small ints instead of
+strings, and no per-record dict (or copy of the classroom name) is kept.
+
+Records are turned into the stored dict format with to_dict() only when they
+are written to a table or returned to a caller.
+"""
+
+from datetime import date
+from .globals import LESSON_SLOTS
+
+# Bookable slots in LESSON_SLOTS order; a slot index is a position in this tuple
+SLOT_NAMES = tuple(slot for slot in LESSON_SLOTS if not slot.startswith("break_"))
+SLOT_INDEX = {slot: i for i, slot in enumerate(SLOT_NAMES)}
+
+
+def pair_letter(pair_index):
+    return chr(65 + pair_index)
+
+
+class ClassSession:
+    __slots__ = ("class_number", "day", "week", "slot", "status")
+
+    def __init__(self, class_number, day, week, slot, status="scheduled"):
+        self.class_number = class_number
+        self.day = day
+        self.week = week
+        self.slot = slot
+        self.status = status
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(
+            record["class_number"],
+            date.fromisoformat(record["date"]).toordinal(),
+            record["week"],
+            SLOT_INDEX[record["slot"]],
+            record["status"],
+        )
+
+    def to_dict(self, classroom_name):
+        session_date = date.fromordinal(self.day)
+        return {
+            "classroom": classroom_name,
+            "class_number": self.class_number,
+            "date": session_date.isoformat(),
+            "week": self.week,
+            "day": session_date.strftime("%A"),
+            "status": self.status,
+            "slot": SLOT_NAMES[self.slot],
+        }
+
+
+class DriveSession:
+    __slots__ = (
+        "pair",
+        "drive_numbers",
+        "day",
+        "slot",
+        "week",
+        "is_backup_slot",
+        "instructor",
+        "status",
+        "rescheduled_from",
+    )
+
+    def __init__(
+        self,
+        pair,
+        drive_numbers,
+        day,
+        slot,
+        week,
+        is_backup_slot,
+        instructor=None,
+        status="scheduled",
+        rescheduled_from=None,
+    ):
+        self.pair = pair
+        self.drive_numbers = drive_numbers
+        self.day = day
+        self.slot = slot
+        self.week = week
+        self.is_backup_slot = is_backup_slot
+        self.instructor = instructor
+        self.status = status
+        self.rescheduled_from = rescheduled_from
+
+    @property
+    def pair_letter(self):
+        return pair_letter(self.pair)
+
+    @property
+    def is_weekend(self):
+        # date ordinals start on a Monday (ordinal 1), so weekday is (ordinal - 1) % 7
+        return (self.day - 1) % 7 >= 5
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(
+            ord(record["pair_letter"]) - 65,
+            record["drive_numbers"],
+            date.fromisoformat(record["date"]).toordinal(),
+            SLOT_INDEX[record["slot"]],
+            record["week"],
+            record["is_backup_slot"],
+            record.get("instructor"),
+            record["status"],
+            record.get("rescheduled_from"),
+        )
+
+    def to_dict(self, classroom_name):
+        record = {
+            "classroom": classroom_name,
+            "pair_letter": self.pair_letter,
+            "drive_numbers": self.drive_numbers,
+            "date": date.fromordinal(self.day).isoformat(),
+            "slot": SLOT_NAMES[self.slot],
+            "week": self.week,
+            "is_backup_slot": self.is_backup_slot,
+            "is_weekend": self.is_weekend,
+            "instructor": self.instructor,
+            "status": self.status,
+        }
+        if self.rescheduled_from:
+            record["rescheduled_from"] = self.rescheduled_from
+        return record
+
+
+def as_class_sessions(classes):
+    """Class records from either ClassSession objects or stored dicts."""
+    return [c if isinstance(c, ClassSession) else ClassSession.from_dict(c) for c in classes]
+
+
+def as_drive_sessions(drives):
+    """Drive records from either DriveSession objects or stored dicts."""
+    return [d if isinstance(d, DriveSession) else DriveSession.from_dict(d) for d in drives]
+
+
+def by_day(records):
+    """Group records by date ordinal, keeping their order."""
+    days = {}
+    for record in records:
+        days.setdefault(record.day, []).append(record)
+    return days
@@ -0,0 +1,84 @@
+"""
+Scheduler Bootstrap Module
+
+Everything the Scheduler form needs when it opens, in one server call:
+schools, classroom names, instructors in display order and the first page of
+the availability heatmap.
+
+The lists carry a version stamp (a hash of their contents). The client keeps
+the last bootstrap it received and sends its version back; when nothing has
+changed the lists are left out of the response and only the heatmap, which
+changes as classrooms are scheduled, is sent.
+"""
+
+import anvil.server
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables
+from .instructor_AVAILABILITY import heatmap_page
+from .app_config import config_version
+from datetime import datetime
+import hashlib
+import json
+
+
+def _version_stamp(schools, classroom_names, instructors):
+    payload = json.dumps(
+        [
+            schools,
+            classroom_names,
+            [(i["id"], i["firstName"], i["surname"]) for i in instructors],
+        ]
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+@anvil.server.callable
+def get_scheduler_bootstrap(known_version=None, start_date=None):
+    """
+    Load the Scheduler form's data.
+
+    Args:
+        known_version (str): Version of the bootstrap the client already holds
+        start_date (date): Day to show in the heatmap (default: today)
+
+    Returns:
+        dict:
+            version (str): Version stamp of the lists
+            unchanged (bool): True if known_version is current and the lists are omitted
+            schools (list): School abbreviations
+            classrooms (list): Classroom names
+            instructors (list): Dicts of row, id, firstName, surname, in display order
+            heatmap (dict): get_heatmap_page payload for the first page of instructors
+            config_version (int): Current app config version, for the client config cache
+    """
+    start_date = start_date or datetime.now().date()
+
+    schools = [s["abbreviation"] for s in app_tables.schools.search()]
+    classroom_names = [c["classroom_name"] for c in app_tables.classrooms.search()]
+    instructor_rows = list(
+        app_tables.users.search(
+            tables.order_by("display_order", ascending=True), is_instructor=True
+        )
+    )
+    instructors = [
+        {
+            "row": instructor,
+            "id": instructor.get_id(),
+            "firstName": instructor["firstName"],
+            "surname": instructor["surname"],
+        }
+        for instructor in instructor_rows
+    ]
+
+    bootstrap = {
+        "version": _version_stamp(schools, classroom_names, instructors),
+        "heatmap": heatmap_page(instructor_rows, start_date),
+        "config_version": config_version(),
+    }
+    bootstrap["unchanged"] = bootstrap["version"] == known_version
+    if not bootstrap["unchanged"]:
+        bootstrap["schools"] = schools
+        bootstrap["classrooms"] = classroom_names
+        bootstrap["instructors"] = instructors
+    return bootstrap
@@ -0,0 +1,218 @@
+"""
+Sessions Module
+
+One row per scheduled class or drive in the `sessions` table, written alongside
+the schedule blobs on `classrooms`. Questions that cut across classrooms
+("what is this instructor doing on this date?") become searches on sessions
+instead of loading and scanning every classroom's complete schedule.
+
+The blobs remain the source of truth for the schedule views and exports;
+sessions are rewritten from them whenever a classroom's schedule changes.
+Sessions link to the assigned instructor, so an instructor's agenda
+(get_instructor_agenda) is one search on instructor and date.
+"""
+
+import anvil.server
+import anvil.users
+import anvil.tables as tables
+import anvil.tables.query as q
+from .data_access import app_tables, in_transaction
+from .app_config import lesson_slots
+from .app_logging import get_logger
+from datetime import date, timedelta
+
+log = get_logger(__name__)
+
+SESSION_TYPES = ("class", "drive")
+# Longest range get_instructor_agenda will return in one call
+MAX_AGENDA_DAYS = 31
+
+
+def _session_rows(classroom_row, daily_schedules, instructors_by_name):
+    """Yield add_row values for each class and drive in a merged daily schedule."""
+    slot_times = lesson_slots()
+    for day in daily_schedules:
+        if day.get("is_vacation"):
+            continue
+        session_date = date.fromisoformat(day["date"])
+        for slot, slot_data in day["slots"].items():
+            session_type = slot_data["type"]
+            if session_type not in SESSION_TYPES:
+                continue
+            details = slot_data.get("details") or {}
+            instructor_name = slot_data.get("instructor")
+            yield {
+                "classroom": classroom_row,
+                "classroom_name": classroom_row["classroom_name"],
+                "date": session_date,
+                "slot": slot,
+                "start_time": slot_times[slot]["start_time"],
+                "session_type": session_type,
+                "title": slot_data["title"],
+                "class_number": details.get("class_number"),
+                "pair_letter": details.get("pair_letter"),
+                "week": details.get("week"),
+                "instructor": instructors_by_name.get(instructor_name),
+                "instructor_name": instructor_name,
+                "status": details.get("status"),
+            }
+
+
+@in_transaction
+def write_classroom_sessions(classroom_row, daily_schedules, instructors_by_name=None):
+    """
+    Replace a classroom's sessions with those in its merged daily schedule.
+
+    Args:
+        classroom_row (Row): Row from classrooms
+        daily_schedules (list): complete_schedule or complete_schedule_with_instructors
+        instructors_by_name (dict): firstName -> users row, to link assigned instructors
+
+    Returns:
+        int: Number of sessions written
+    """
+    app_tables.sessions.search(classroom=classroom_row).delete_all_rows()
+    rows = list(_session_rows(classroom_row, daily_schedules or [], instructors_by_name or {}))
+    if rows:
+        app_tables.sessions.add_rows(rows)
+    return len(rows)
+
+
+def session_to_dict(session_row):
+    return {
+        "classroom_name": session_row["classroom_name"],
+        "date": session_row["date"],
+        "slot": session_row["slot"],
+        "start_time": session_row["start_time"],
+        "session_type": session_row["session_type"],
+        "title": session_row["title"],
+        "class_number": session_row["class_number"],
+        "pair_letter": session_row["pair_letter"],
+        "week": session_row["week"],
+        "instructor_name": session_row["instructor_name"],
+        "status": session_row["status"],
+    }
+
+
+def search_sessions(
+    start_date=None, end_date=None, instructor=None, classroom_name=None, session_type=None, slot=None
+):
+    """
+    Search sessions, ordered by date and start time.
+    Returns the table search iterator; see get_sessions for plain dicts.
+    """
+    filters = {}
+    if start_date and end_date:
+        filters["date"] = q.between(start_date, end_date, max_inclusive=True)
+    elif start_date:
+        filters["date"] = q.greater_than_or_equal_to(start_date)
+    elif end_date:
+        filters["date"] = q.less_than_or_equal_to(end_date)
+    if instructor is not None:
+        filters["instructor"] = instructor
+    if classroom_name:
+        filters["classroom_name"] = classroom_name
+    if session_type:
+        filters["session_type"] = session_type
+    if slot:
+        filters["slot"] = slot
+    return app_tables.sessions.search(
+        tables.order_by("date"), tables.order_by("start_time"), **filters
+    )
+
+
+@anvil.server.callable(require_user=True)
+def get_sessions(
+    start_date=None, end_date=None, instructor=None, classroom_name=None, session_type=None, slot=None
+):
+    """
+    Sessions matching all of the given filters, across every classroom.
+    As with the agenda, only admins can see other instructors' sessions;
+    other users only get their own.
+
+    Args:
+        start_date (date): First date to include
+        end_date (date): Last date to include
+        instructor (Row): Only sessions assigned to this users row (defaults to
+            the logged-in user for non-admins)
+        classroom_name (str): Only sessions in this classroom
+        session_type (str): "class" or "drive"
+        slot (str): Only sessions in this lesson slot
+
+    Returns:
+        list: Session dicts ordered by date and start time
+    """
+    user = anvil.users.get_user()
+    if not user["is_admin"]:
+        if instructor is None:
+            instructor = user
+        elif instructor != user:
+            raise anvil.server.PermissionDenied("Only admins can see another instructor's sessions")
+    return [
+        session_to_dict(row)
+        for row in search_sessions(
+            start_date, end_date, instructor, classroom_name, session_type, slot
+        )
+    ]
+
+
+@anvil.server.background_task
+def rebuild_session_index():
+    """
+    Rebuild sessions for every classroom from its schedule blobs.
+    Run once to backfill, or after editing classroom schedules by hand.
+    """
+    instructors_by_name = {
+        instructor["firstName"]: instructor
+        for instructor in app_tables.users.search(is_instructor=True)
+    }
+    total = 0
+    for classroom_row in app_tables.classrooms.search():
+        daily_schedules = (
+            classroom_row["complete_schedule_with_instructors"]
+            or classroom_row["complete_schedule"]
+        )
+        if daily_schedules:
+            total += write_classroom_sessions(classroom_row, daily_schedules, instructors_by_name)
+    log.info("Rebuilt %s sessions", total)
+    return total
+
+
+@anvil.server.callable
+def get_instructor_agenda(start_date=None, days=7, instructor=None):
+    """
+    An instructor's classes and drives, grouped by day.
+    Defaults to the logged-in user's next seven days; only admins can see
+    another instructor's agenda.
+
+    Args:
+        start_date (date): First day (defaults to today)
+        days (int): Number of days to cover, up to MAX_AGENDA_DAYS
+        instructor (Row): users row (defaults to the logged-in user)
+
+    Returns:
+        list: One dict per day that has sessions: date, day and its sessions in time order
+    """
+    user = anvil.users.get_user()
+    if user is None:
+        raise anvil.server.PermissionDenied("Log in to see your agenda")
+    if instructor is None:
+        instructor = user
+    elif instructor != user and not user["is_admin"]:
+        raise anvil.server.PermissionDenied("Only admins can see another instructor's agenda")
+    start_date = start_date or date.today()
+    end_date = start_date + timedelta(days=min(days, MAX_AGENDA_DAYS) - 1)
+
+    slot_times = lesson_slots()
+    agenda = []
+    for row in search_sessions(start_date, end_date, instructor=instructor):
+        session = session_to_dict(row)
+        session["end_time"] = slot_times[session["slot"]]["end_time"]
+        if not agenda or agenda[-1]["date"] != session["date"]:
+            agenda.append({
+                "date": session["date"],
+                "day": session["date"].strftime("%A"),
+                "sessions": [],
+            })
+        agenda[-1]["sessions"].append(session)
+    return agenda
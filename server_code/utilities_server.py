@@ -1,49 +1,127 @@
 import anvil.google.auth, anvil.google.drive, anvil.google.mail
 from anvil.google.drive import app_files
-import anvil.files
-from anvil.files import data_files
 import anvil.users
 import anvil.tables as tables
 import anvil.tables.query as q
-from anvil.tables import app_tables
+from .data_access import app_tables, in_transaction
 import anvil.server
 import csv
 import json
 import io
+import hashlib
 import anvil.media
 from collections import OrderedDict
 import pandas as pd
 from datetime import datetime, timedelta
-from .globals import LESSON_SLOTS, AVAILABILITY_MAPPING
+from .globals import AVAILABILITY_MAPPING
+from .app_logging import get_logger
+from .instructor_eligibility import invalidate_eligibility_index
+from .app_config import (
+    replace_teen_driving_schedule,
+    lesson_slots,
+    coerce_time,
+    coerce_day_list,
+    typed_lesson_slots,
+)
+
+log = get_logger(__name__)
 
 ###########################################################
 # General data import function to take CSV data and convert to JSON.
 
 
-@anvil.server.callable
-def csv_to_structured_json(csv_file):
+def _iter_csv_lines(csv_file):
+    """
+    Yield the lines of a CSV file path or Media object one at a time,
+    so readers never hold a list of every row in memory.
+    """
     if isinstance(csv_file, str):
-        print("CSV convert function has file")
-        with open(csv_file, "r") as f:
-            reader = csv.reader(f)
-            data = list(reader)
+        with open(csv_file, "r", newline="") as f:
+            for line in f:
+                yield line
     else:
-        reader = csv.reader(csv_file.get_bytes().decode("utf-8").splitlines())
-        data = list(reader)
+        stream = io.TextIOWrapper(
+            io.BytesIO(csv_file.get_bytes()), encoding="utf-8", newline=""
+        )
+        for line in stream:
+            yield line
+
+
+# Teen driving schedule upload: one row per lesson slot keyed by "Title".
+# Each check takes the raw cell string and returns the typed value (see
+# app_config) or raises ValueError, so a bad upload is refused before it
+# replaces the current schedule.
+TEEN_DRIVE_SCHEDULE_SCHEMA = {
+    "start_time": coerce_time,
+    "end_time": coerce_time,
+    "term": coerce_day_list,
+    "vacation": coerce_day_list,
+}
+
+
+def _coerce_row(row, schema):
+    """Apply the schema's checks to a row dict; other blank cells become None."""
+    record = {}
+    for column, value in row.items():
+        if not column:
+            continue
+        coerce = schema.get(column) if schema else None
+        if value is None or value.strip() == "":
+            if coerce:
+                raise ValueError(f"Column '{column}': missing value")
+            record[column] = None
+            continue
+        try:
+            record[column] = coerce(value) if coerce else value.strip()
+        except ValueError as e:
+            raise ValueError(f"Column '{column}': {e}")
+    return record
+
+
+def convert_csv_with_schema(csv_file, key_column, schema=None):
+    """
+    Stream a CSV and convert it to a dict keyed by key_column.
+    Columns listed in schema are checked and normalised here; the rest are kept as strings.
 
-    headers = data[0][1:]  # Column headers (excluding first column)
-    row_headers = [row[0] for row in data[1:]]  # Row headers (first column)
+    Args:
+        csv_file: File path or Media object
+        key_column (str): Column whose value becomes each record's key
+        schema (dict): Column name -> coercion function
 
+    Returns:
+        dict: key -> checked record (without the key column)
+    """
     structured_data = {}
-    for i, row in enumerate(data[1:], start=0):
-        row_header = row_headers[i]
-        row_data = {}
+    reader = csv.DictReader(_iter_csv_lines(csv_file))
+    for line_number, row in enumerate(reader, start=2):
+        key = (row.pop(key_column, None) or "").strip()
+        if not key:
+            continue
+        try:
+            structured_data[key] = _coerce_row(row, schema)
+        except ValueError as e:
+            raise ValueError(f"Row {line_number} ({key}): {e}")
+    return structured_data
 
-        for j, value in enumerate(row[1:], start=0):
-            column_header = headers[j]
-            row_data[column_header] = value
 
-        structured_data[row_header] = row_data
+@anvil.server.callable
+def csv_to_structured_json(csv_file, schema=None):
+    """
+    Convert a matrix CSV (row headers in the first column, column headers in the
+    first row) to {row_header: {column_header: value}}.
+    """
+    reader = csv.reader(_iter_csv_lines(csv_file))
+    header_row = next(reader, None)
+    if not header_row:
+        return {}
+    headers = header_row[1:]  # Column headers (excluding first column)
+
+    structured_data = {}
+    for row in reader:
+        if not row:
+            continue
+        # Row header is the first column
+        structured_data[row[0]] = _coerce_row(dict(zip(headers, row[1:])), schema)
 
     return structured_data
 
@@ -65,45 +143,23 @@ def print_json(json_data):
 
 @anvil.server.callable
 def convert_schedule_csv_to_json(csv_file):
-    if isinstance(csv_file, str):
-        with open(csv_file, "r") as f:
-            reader = csv.DictReader(f)
-            data = list(reader)
-    else:
-        content = csv_file.get_bytes().decode("utf-8")
-        reader = csv.DictReader(content.splitlines())
-        data = list(reader)
-
-    structured_data = {}
-
-    for row in data:
-        # Use the "Title" field as the main key
-        title = row.pop("Title", None)
-        if title:
-            # Add all other columns as properties
-            structured_data[title] = {k: v for k, v in row.items() if k}
-
-    return structured_data
+    """
+    Convert the teen driving schedule upload to typed lesson slot records.
+    Times are normalised to 'HH:MM' with start_minute / end_minute added, and
+    term / vacation become lists of full day names.
+    """
+    records = convert_csv_with_schema(csv_file, "Title", TEEN_DRIVE_SCHEDULE_SCHEMA)
+    return typed_lesson_slots(records)
 
 
 # Update this to parse classroom schedules
 @anvil.server.callable
 def update_teen_drive_schedule(file):
     json_payload = convert_schedule_csv_to_json(file)
-    current_variables = app_tables.global_variables_edit_with_care.get(version="latest")
-
-    if current_variables:
-        current_schedule = current_variables["current_teen_driving_schedule"]
-        current_variables.update(
-            previous_teen_driving_schedule=current_schedule,
-            current_teen_driving_schedule=json_payload,
-        )
-        return True
-    else:
-        app_tables.global_variables_edit_with_care.add_row(
-            version="latest", current_teen_driving_schedule=json_payload
-        )
-        return True
+    # Swaps the schedules and bumps config_version in one transaction, so
+    # cached configs are invalidated along with the write
+    replace_teen_driving_schedule(json_payload)
+    return True
 
 
 ###########################################################
@@ -141,7 +197,9 @@ def export_json_to_csv(json_data, filename="schedule.csv"):
         "text/csv", output.getvalue().encode("utf-8"), name=filename
     )
 
-    app_tables.files.add_row(filename=filename, file=csv_media, file_type="CSV")
+    app_tables.files.add_row(
+        filename=filename, file=csv_media, file_type="CSV", created=datetime.now()
+    )
 
 
 @anvil.server.callable
@@ -160,8 +218,109 @@ def sanity_check_write():
     ws.rows[:] = []
 
 
+SHEET_DAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+SHEET_SLOTS = [
+    "lesson_slot_1",
+    "lesson_slot_2",
+    "lesson_slot_3",
+    "lesson_slot_4",
+    "lesson_slot_5",
+]
+
+
+def _availability_sheet_rows(availability, school_prefs, vacation_days):
+    """
+    Build the full list of worksheet rows for one instructor.
+    Each row is a dict keyed by the worksheet's column headers.
+    """
+    rows = []
+
+    # Header row
+    header_row = {"Slot": "Slot"}
+    for day in SHEET_DAYS:
+        header_row[day.capitalize()] = day.capitalize()
+    rows.append(header_row)
+
+    # Availability rows
+    for slot in SHEET_SLOTS:
+        row_data = {"Slot": slot}
+        for day in SHEET_DAYS:
+            day_data = availability.get(day, {})
+            row_data[day.capitalize()] = day_data.get(slot, "No")
+        rows.append(row_data)
+
+    # School preferences
+    rows.append({"Slot": "School Preferences:"})
+    rows.append({"Slot": str(school_prefs)})
+
+    # Vacation days
+    rows.append({"Slot": "Vacation Days:"})
+    if vacation_days and "vacation_days" in vacation_days:
+        for vac_day in vacation_days["vacation_days"]:
+            # Format: "Reason: Personal Day (2025-05-06 to 2025-05-07)"
+            vac_text = f"{vac_day['reason']} ({vac_day['start_date']} to {vac_day['end_date']})"
+            rows.append({"Slot": vac_text})
+    else:
+        rows.append({"Slot": "No vacation days scheduled"})
+
+    return rows
+
+
+def _availability_sheet_hash(rows):
+    """Stable hash of the rows we would write, used to skip unchanged instructors."""
+    payload = json.dumps(rows, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _sync_worksheet_rows(worksheet, desired_rows):
+    """
+    Bring a worksheet in line with desired_rows using as few API calls as possible.
+    The current rows are read once; only cells whose value differs are written,
+    missing rows are appended and surplus rows are deleted from the bottom up.
+
+    Returns:
+        int: Number of write operations issued
+    """
+    try:
+        fields = worksheet.fields
+        existing_rows = list(worksheet.rows)
+    except TypeError:
+        # Empty worksheet
+        fields = []
+        existing_rows = []
+
+    writes = 0
+    for index, desired in enumerate(desired_rows):
+        if index >= len(existing_rows):
+            worksheet.add_row(**desired)
+            writes += 1
+            continue
+
+        current = existing_rows[index]
+        for field in fields:
+            value = str(desired.get(field, ""))
+            if current[field] != value:
+                current[field] = value
+                writes += 1
+
+    # Delete from the bottom so row positions above stay valid
+    for row in reversed(existing_rows[len(desired_rows):]):
+        row.delete()
+        writes += 1
+
+    return writes
+
+
 @anvil.server.background_task
-def sync_instructor_availability_to_sheets():
+def sync_instructor_availability_to_sheets(force=False):
     """
     Sync instructor availability to Google Sheets.
     Creates one sheet per instructor with their weekly availability.
@@ -169,6 +328,12 @@ def sync_instructor_availability_to_sheets():
     - First row (row 1): Days of the week
     - First column (column 1): Lesson slots
     - Data grid: Availability for each slot/day combination
+
+    Instructors whose availability hash matches the last successful sync are skipped,
+    and for the rest only changed cells are written back.
+
+    Args:
+        force (bool): Rewrite every instructor's sheet even if the hash is unchanged
     """
     # Get all instructors
     instructors = app_tables.users.search(is_instructor=True)
@@ -180,10 +345,20 @@ def sync_instructor_availability_to_sheets():
         print(f"Error accessing spreadsheet: {str(e)}")
         return False
 
+    # Load every instructor schedule in one search rather than one get per instructor
+    schedules = {
+        row["instructor"].get_id(): row
+        for row in app_tables.instructor_schedules.search()
+        if row["instructor"]
+    }
+
+    synced = 0
+    skipped = 0
+    writes = 0
+
     # Process each instructor
     for instructor in instructors:
-        # Get instructor schedule
-        instructor_row = app_tables.instructor_schedules.get(instructor=instructor)
+        instructor_row = schedules.get(instructor.get_id())
         if not instructor_row:
             print(f"No schedule found for {instructor['firstName']}")
             continue
@@ -193,6 +368,14 @@ def sync_instructor_availability_to_sheets():
         school_prefs = instructor_row["school_preferences"]
         vacation_days = instructor_row["vacation_days"]
 
+        desired_rows = _availability_sheet_rows(
+            availability, school_prefs, vacation_days
+        )
+        sync_hash = _availability_sheet_hash(desired_rows)
+        if not force and instructor_row["sheets_sync_hash"] == sync_hash:
+            skipped += 1
+            continue
+
         # Create sheet name (using underscore to avoid spaces)
         sheet_name = f"{instructor['firstName']}_{instructor['surname']}"
 
@@ -204,69 +387,7 @@ def sync_instructor_availability_to_sheets():
             continue
 
         try:
-            # Prepare data
-            days = [
-                "monday",
-                "tuesday",
-                "wednesday",
-                "thursday",
-                "friday",
-                "saturday",
-                "sunday",
-            ]
-            slots = [
-                "lesson_slot_1",
-                "lesson_slot_2",
-                "lesson_slot_3",
-                "lesson_slot_4",
-                "lesson_slot_5",
-            ]
-
-            # Clear existing data by deleting rows
-            try:
-                rows = list(worksheet.rows)
-                if rows:
-                    for row in rows:
-                        row.delete()
-            except TypeError:
-                pass
-
-            # Prepare all rows at once
-            rows = []
-
-            # Header row
-            header_row = {"Slot": "Slot"}
-            for day in days:
-                header_row[day.capitalize()] = day.capitalize()
-            rows.append(header_row)
-
-            # Availability rows
-            for slot in slots:
-                row_data = {"Slot": slot}
-                for day in days:
-                    day_data = availability.get(day, {})
-                    status = day_data.get(slot, "No")
-                    row_data[day.capitalize()] = status
-                rows.append(row_data)
-
-            # Add all rows one by one
-            for row in rows:
-                worksheet.add_row(**row)
-
-            # Add school preferences
-            worksheet.add_row(**{"Slot": "School Preferences:"})
-            worksheet.add_row(**{"Slot": str(school_prefs)})
-
-            # Add vacation days
-            worksheet.add_row(**{"Slot": "Vacation Days:"})
-            if vacation_days and "vacation_days" in vacation_days:
-                for vac_day in vacation_days["vacation_days"]:
-                    # Format: "Reason: Personal Day (2025-05-06 to 2025-05-07)"
-                    vac_text = f"{vac_day['reason']} ({vac_day['start_date']} to {vac_day['end_date']})"
-                    worksheet.add_row(**{"Slot": vac_text})
-            else:
-                worksheet.add_row(**{"Slot": "No vacation days scheduled"})
-
+            writes += _sync_worksheet_rows(worksheet, desired_rows)
         except Exception as e:
             print(f"Error writing data to worksheet: {str(e)}")
             print(f"Error type: {type(e)}")
@@ -275,6 +396,13 @@ def sync_instructor_availability_to_sheets():
             print(f"Traceback: {traceback.format_exc()}")
             continue
 
+        # Only record the hash once the sheet is known to match it
+        instructor_row.update(sheets_sync_hash=sync_hash)
+        synced += 1
+
+    print(
+        f"Sheets sync: {synced} instructors updated, {skipped} unchanged, {writes} writes"
+    )
     return True
 
 
@@ -286,6 +414,7 @@ def export_instructor_availability():
     """
     # Get all instructors
     instructors = app_tables.users.search(is_instructor=True)
+    slot_times = lesson_slots()
 
     # Create Excel writer
     output = io.BytesIO()
@@ -325,7 +454,7 @@ def export_instructor_availability():
                 for slot in slots:
                     status = day_data.get(slot, "No")
                     # Get the time range for this slot
-                    slot_info = LESSON_SLOTS[slot]
+                    slot_info = slot_times[slot]
                     time_range = f"{slot_info['start_time']}-{slot_info['end_time']}"
                     data.append(
                         {"Day": day.capitalize(), "Slot": time_range, "Status": status}
@@ -370,7 +499,10 @@ def export_instructor_availability():
     )
 
     app_tables.files.add_row(
-        filename="instructor_availability.xlsx", file=excel_media, file_type="Excel"
+        filename="instructor_availability.xlsx",
+        file=excel_media,
+        file_type="Excel",
+        created=datetime.now(),
     )
 
     return excel_media
@@ -385,6 +517,7 @@ def export_instructor_eight_month_availability():
     """
     # Get all instructors
     instructors = app_tables.users.search(is_instructor=True)
+    slot_times = lesson_slots()
 
     # Create Excel writer
     output = io.BytesIO()
@@ -421,8 +554,8 @@ def export_instructor_eight_month_availability():
             # Create data structure
             data = []
             for slot in slots:
-              start = format_time_12hr(LESSON_SLOTS[slot]['start_time'])
-              end = format_time_12hr(LESSON_SLOTS[slot]['end_time'])
+              start = format_time_12hr(slot_times[slot]['start_time'])
+              end = format_time_12hr(slot_times[slot]['end_time'])
               row_data = {"Lesson": f"{start}–{end}"}
               for orig_date, formatted_date in formatted_dates:
                 # Get the value directly from the availability data (using original date as key)
@@ -457,6 +590,7 @@ def export_instructor_eight_month_availability():
         filename=filename,
         file=excel_media,
         file_type="Excel",
+        created=datetime.now(),
     )
 
     if excel_media:
@@ -528,7 +662,8 @@ def export_classroom_schedule(classroom_name):
     app_tables.files.add_row(
         filename=filename,
         file=excel_media,
-        file_type="Excel"
+        file_type="Excel",
+        created=datetime.now(),
     )
     results_message = "Download created successfully"
 
@@ -550,7 +685,7 @@ def export_merged_classroom_schedule(classroom_name, type=None):
     """
 
     # Get merged schedule
-    print("Building merged schedule download")
+    log.debug("Building merged schedule download for %s", classroom_name)
     if type == 'lessons':
       daily_schedules = app_tables.classrooms.get(classroom_name=classroom_name)[ "complete_schedule"]
       has_instructor = False
@@ -558,7 +693,7 @@ def export_merged_classroom_schedule(classroom_name, type=None):
       daily_schedules = app_tables.classrooms.get(classroom_name=classroom_name)[ "complete_schedule_with_instructors"]
       has_instructor = True
     else:
-      print("could not find")
+      log.warning("Unknown merged schedule export type %s", type, classroom=classroom_name)
   
         
 
@@ -567,12 +702,13 @@ def export_merged_classroom_schedule(classroom_name, type=None):
     with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
         # Create DataFrame with slots as index and days as columns
         data = {}
+        slot_times = lesson_slots()
         slot_order = [
-            slot for slot in LESSON_SLOTS.keys() if not slot.startswith("break_")
+            slot for slot in slot_times.keys() if not slot.startswith("break_")
         ]
 
         # Create slot to time mapping
-        slot_to_time = {slot: LESSON_SLOTS[slot]["start_time"] for slot in slot_order}
+        slot_to_time = {slot: slot_times[slot]["start_time"] for slot in slot_order}
 
         # Initialize data structure
         for slot in slot_order:
@@ -626,7 +762,6 @@ def export_merged_classroom_schedule(classroom_name, type=None):
         header_format = workbook.add_format(
             {"bold": True, "bg_color": "#D9E1F2", "border": 1, "align": "center"}
         )
-        print("Adding dates")
         date_format = workbook.add_format(
             {"num_format": "yyyy-mm-dd", "align": "center"}
         )
@@ -667,7 +802,7 @@ def export_merged_classroom_schedule(classroom_name, type=None):
 
     # Create media object and save to database
 
-    print("Creating media object")
+    log.debug("Creating media object %s", filename)
     excel_media = anvil.BlobMedia(
       content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
       content=output.getvalue(),
@@ -678,87 +813,232 @@ def export_merged_classroom_schedule(classroom_name, type=None):
         filename=filename,
         file=excel_media,
         file_type="Excel",
+        created=datetime.now(),
     )
     results_message = f"File created successfully! Filename: {filename}"
     return filename, results_message
 
+
+# Codes an instructor can declare in a weekly availability upload
+# (Scheduled, Booked and Vacation are set by the system, not by instructors)
+IMPORT_AVAILABILITY_CODES = [
+    code
+    for code, value in AVAILABILITY_MAPPING.items()
+    if value <= AVAILABILITY_MAPPING["Class Only"]
+]
+
+
+def _slot_offered(slot_name, day, schedule_type):
+    """
+    Check the LESSON_SLOTS grid to see whether a slot runs on a given day.
+    schedule_type is 'term' or 'vacation', matching the LESSON_SLOTS keys.
+    """
+    return day.capitalize() in lesson_slots()[slot_name][schedule_type]
+
+
+def _parse_availability_row(row, days, slots, schedule_type):
+    """
+    Validate one instructor's availability cells and build the weekly structure.
+    A code other than "No" in a slot that doesn't run that day is kept but
+    reported as a warning, since the grid only limits when slots are offered.
+
+    Returns:
+        tuple: (availability_data, errors, warnings) - availability_data is None if any cell is invalid
+    """
+    errors = []
+    warnings = []
+    cells = row[1:]
+    expected = len(days) * len(slots)
+    if len(cells) < expected:
+        errors.append(f"Expected {expected} availability cells, found {len(cells)}")
+
+    availability_data = {"weekly_availability": {}}
+    for i, day in enumerate(days):
+        day_slots = {}
+        for j, slot in enumerate(slots):
+            col_idx = (i * len(slots)) + j
+            if col_idx >= len(cells):
+                break
+            value = cells[col_idx].strip()
+            if value not in IMPORT_AVAILABILITY_CODES:
+                errors.append(f"{day} {slot}: invalid value '{value}'")
+            elif value != "No" and not _slot_offered(slot, day, schedule_type):
+                warnings.append(
+                    f"{day} {slot}: '{value}' but slot is not offered on {day} ({schedule_type})"
+                )
+            day_slots[slot] = value
+        availability_data["weekly_availability"][day] = day_slots
+
+    if errors:
+        return None, errors, warnings
+    return availability_data, [], warnings
+
+
+def _rejected_row(line_number, row_header, errors):
+    if isinstance(errors, str):
+        errors = [errors]
+    return {"line": line_number, "row_header": row_header, "errors": errors}
+
+
+@in_transaction
+def _apply_availability_import(updates, schedules):
+    """
+    Write every accepted instructor availability in a single transaction.
+
+    Args:
+        updates (dict): instructor row id -> (instructor row, {column: value})
+        schedules (dict): instructor row id -> existing instructor_schedules row
+    """
+    for instructor_id, (instructor, column_values) in updates.items():
+        instructor_schedule = schedules.get(instructor_id)
+        if not instructor_schedule:
+            instructor_schedule = app_tables.instructor_schedules.add_row(
+                instructor=instructor
+            )
+            invalidate_eligibility_index()
+        instructor_schedule.update(**column_values)
+
+
 @anvil.server.callable
 def import_instructor_availability_fromCSV(csv_file):
     """
     Import instructor availability from CSV and save to instructor record.
     CSV format: One row per instructor with 35 columns (7 days × 5 slots)
     Row header format: instructor_name_type (e.g., 'john_term' or 'john_vacation')
+
+    Rejected rows and warnings are logged; clients that need them call
+    import_availability_csv, which returns the report.
     """
-    # Read CSV data
-    if isinstance(csv_file, str):
-        with open(csv_file, "r") as f:
-            reader = csv.reader(f)
-            data = list(reader)
-    else:
-        reader = csv.reader(csv_file.get_bytes().decode("utf-8").splitlines())
-        data = list(reader)
+    report = import_availability_csv(csv_file)
+    for rejected in report["rejected"]:
+        log.warning(
+            "Availability import line %s (%s) rejected: %s",
+            rejected["line"],
+            rejected["row_header"],
+            "; ".join(rejected["errors"]),
+        )
+    for warned in report["warnings"]:
+        log.warning(
+            "Availability import line %s (%s): %s",
+            warned["line"],
+            warned["row_header"],
+            "; ".join(warned["warnings"]),
+        )
+    return True
+
+
+@anvil.server.callable(require_user=True)
+def import_availability_csv(csv_file):
+    """
+    Import instructor availability from CSV and report on every row.
 
-    # Get headers and remove first column (instructor name)
-    headers = data[0][1:]
+    Rows are streamed and validated against AVAILABILITY_MAPPING and the LESSON_SLOTS
+    grid. Valid rows are applied together in one transaction; invalid rows are
+    reported back rather than written.
+
+    Returns:
+        dict: {"updated": [...], "rejected": [{"line", "row_header", "errors"}],
+               "warnings": [{"line", "row_header", "warnings"}]}
+    """
+    days = [
+        "monday",
+        "tuesday",
+        "wednesday",
+        "thursday",
+        "friday",
+        "saturday",
+        "sunday",
+    ]
+    slots = [f"lesson_slot_{slot + 1}" for slot in range(5)]
+
+    # Build the lookups once instead of one get per CSV row
+    instructors_by_name = {}
+    duplicate_names = set()
+    for user in app_tables.users.search():
+        if not user["firstName"]:
+            continue
+        name_key = user["firstName"].strip().lower()
+        if name_key in instructors_by_name:
+            duplicate_names.add(name_key)
+        instructors_by_name[name_key] = user
+    schedules = {
+        row["instructor"].get_id(): row
+        for row in app_tables.instructor_schedules.search()
+        if row["instructor"]
+    }
+
+    updates = {}
+    report = {"updated": [], "rejected": [], "warnings": []}
+
+    reader = csv.reader(_iter_csv_lines(csv_file))
+    next(reader, None)  # Skip the header row
+
+    for line_number, row in enumerate(reader, start=2):
+        if not row or not any(cell.strip() for cell in row):
+            continue
 
-    # Process each instructor row
-    for row in data[1:]:
         # Get instructor name and type from first column
-        instructor_id = row[0]
-        if "_" not in instructor_id:
-            print(f"Skipping invalid instructor ID format: {instructor_id}")
+        row_header = row[0].strip()
+
+        if row_header.count("_") != 1:
+            report["rejected"].append(
+                _rejected_row(line_number, row_header, f"Invalid instructor ID format: {row_header}")
+            )
             continue
 
-        instructor_name, schedule_type = instructor_id.split("_")
+        instructor_name, schedule_type = row_header.split("_")
         if schedule_type not in ["term", "vacation"]:
-            print(f"Skipping invalid schedule type: {schedule_type}")
+            report["rejected"].append(
+                _rejected_row(line_number, row_header, f"Invalid schedule type: {schedule_type}")
+            )
             continue
 
-        # Find instructor in database
-        instructor = app_tables.users.get(firstName=instructor_name)
+        name_key = instructor_name.strip().lower()
+        instructor = instructors_by_name.get(name_key)
         if not instructor:
-            print(f"Instructor not found: {instructor_name}")
+            report["rejected"].append(
+                _rejected_row(line_number, row_header, f"Instructor not found: {instructor_name}")
+            )
             continue
-
-        # Get or create instructor schedule record
-        instructor_schedule = app_tables.instructor_schedules.get(instructor=instructor)
-        if not instructor_schedule:
-            instructor_schedule = app_tables.instructor_schedules.add_row(
-                instructor=instructor
+        if name_key in duplicate_names:
+            report["rejected"].append(
+                _rejected_row(line_number, row_header, f"More than one user is named {instructor_name}")
             )
+            continue
 
-        # Parse availability data into JSON structure
-        availability_data = {"weekly_availability": {}}
-        days = [
-            "monday",
-            "tuesday",
-            "wednesday",
-            "thursday",
-            "friday",
-            "saturday",
-            "sunday",
-        ]
-
-        for i, day in enumerate(days):
-            day_slots = {}
-            for slot in range(5):
-                col_idx = (i * 5) + slot
-                if col_idx < len(row[1:]):  # Ensure we don't go out of bounds
-                    value = row[
-                        col_idx + 1
-                    ]  # +1 because first column is instructor name
-                    day_slots[f"lesson_slot_{slot + 1}"] = value
-            availability_data["weekly_availability"][day] = day_slots
+        availability_data, errors, warnings = _parse_availability_row(
+            row, days, slots, schedule_type
+        )
+        if errors:
+            report["rejected"].append(
+                _rejected_row(line_number, row_header, errors)
+            )
+            continue
+        if warnings:
+            report["warnings"].append(
+                {"line": line_number, "row_header": row_header, "warnings": warnings}
+            )
 
         # Save to appropriate field based on schedule type
-        if schedule_type == "term":
-            instructor_schedule.update(weekly_availability=availability_data)
-        else:  # vacation
-            instructor_schedule.update(vacation_availability=availability_data)
+        column = (
+            "weekly_availability" if schedule_type == "term" else "vacation_availability"
+        )
+        instructor_id = instructor.get_id()
+        updates.setdefault(instructor_id, (instructor, {}))[1][column] = availability_data
+        report["updated"].append(
+            {"instructor": instructor["firstName"], "schedule_type": schedule_type}
+        )
 
-        print(f"Updated {schedule_type} availability for {instructor_name}")
+    if updates:
+        _apply_availability_import(updates, schedules)
 
-    return True
+    log.info(
+        "Availability import: %s rows applied, %s rejected, %s with warnings",
+        len(report["updated"]),
+        len(report["rejected"]),
+        len(report["warnings"]),
+    )
+    return report
 
 
 @anvil.server.callable
@@ -770,6 +1050,7 @@ def add_new_instructor():
             print("already listed")
         else:
             app_tables.instructor_schedules.add_row(instructor=instructor)
+            invalidate_eligibility_index()
 
 
 def fix_slot_names(data):
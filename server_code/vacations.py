@@ -0,0 +1,128 @@
+"""
+Vacations Module
+
+Instructor vacations (instructor_schedules.vacation_days) as a VacationIndex:
+sorted, merged date intervals searched with bisect, so checking a day is
+O(log n) in the number of vacations and a long vacation is stored as one
+interval rather than a list of every date in it.
+
+vacation_index() parses the stored value and memoizes the result by content, so
+capacity checks, seven-month availability and scheduling share one index per
+distinct vacation list. The memo keeps the VACATION_INDEX_CACHE_SIZE most
+recently used lists.
+"""
+
+from .app_logging import get_logger
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import date, datetime
+import json
+
+log = get_logger(__name__)
+
+# Most distinct vacation lists kept in the memo before the least recently used is dropped
+VACATION_INDEX_CACHE_SIZE = 512
+
+_indexes = OrderedDict()
+
+
+class VacationIndex:
+    """
+    Attributes:
+        starts (list): Interval start dates as ordinals, ascending
+        ends (list): Matching interval end dates (inclusive) as ordinals
+    """
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1] + 1:
+                # Overlapping or back-to-back: extend the previous interval
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __contains__(self, day):
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        ordinal = day.toordinal()
+        i = bisect_right(self.starts, ordinal) - 1
+        return i >= 0 and ordinal <= self.ends[i]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def intervals(self):
+        """(start date, end date) pairs, inclusive."""
+        return [
+            (date.fromordinal(start), date.fromordinal(end))
+            for start, end in zip(self.starts, self.ends)
+        ]
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _parse_intervals(vacation_data, instructor_name):
+    if isinstance(vacation_data, str):
+        try:
+            vacation_data = json.loads(vacation_data)
+        except json.JSONDecodeError:
+            log.warning("Error parsing vacation days JSON for %s", instructor_name)
+            return []
+    if isinstance(vacation_data, dict):
+        vacation_data = vacation_data.get("vacation_days", [])
+    if not isinstance(vacation_data, list):
+        return []
+
+    intervals = []
+    for vacation in vacation_data:
+        try:
+            if isinstance(vacation, dict):
+                start = _as_date(vacation.get("start_date", ""))
+                end = _as_date(vacation.get("end_date", ""))
+            else:
+                # A single date
+                start = end = _as_date(vacation)
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            log.warning("Error processing vacation date range for %s: %s", instructor_name, e)
+            continue
+        if start <= end:
+            intervals.append((start.toordinal(), end.toordinal()))
+    return intervals
+
+
+def vacation_index(vacation_data, instructor_name=None):
+    """
+    VacationIndex for a stored vacation_days value.
+
+    Accepts {"vacation_days": [{"start_date": ..., "end_date": ...}, ...]}, the
+    same as a JSON string, or a bare list of ranges and/or single dates.
+
+    Args:
+        vacation_data: instructor_schedules["vacation_days"]
+        instructor_name (str): Used in warnings about unreadable entries
+
+    Returns:
+        VacationIndex
+    """
+    if not vacation_data:
+        return VacationIndex()
+    key = json.dumps(vacation_data, sort_keys=True, default=str)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = VacationIndex(_parse_intervals(vacation_data, instructor_name))
+        if len(_indexes) > VACATION_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    else:
+        _indexes.move_to_end(key)
+    return index